@@ -1,170 +1,245 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, g, render_template, request, jsonify, session, stream_with_context, url_for
 import json
 import os
-import re
-import requests
-from urllib.parse import urlparse
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
-from llm_library import generate_image_with_style
+from werkzeug.serving import is_running_from_reloader
+from brand_sources import fetch_brand_info, normalize_domain
+from hashing import fingerprint
+from image_variants import create_image_post_processor
+from jobs import create_job_queue
+from metrics import HTTP_REQUEST_SECONDS, REGISTRY
+from speculation import create_speculative_executor
+from state_projection import projection_inputs
+from state_store import create_state_store
+from llm_library import (
+    LLMError,
+    LLMRateLimitError,
+    bypass_completion_cache,
+    save_image_with_style,
+    warm_up_clients,
+)
 from main import (
     research_agent_node,
     brand_strategist_node,
+    brand_strategist_stream,
     creative_director_node,
+    creative_director_stream,
     creation_of_scripts_node,
     generate_global_themes_node,
-    generate_frame_prompts_node,
+    generate_frame_prompt,
+    generate_frame_prompts,
+    is_fallback_themes,
+    DEGRADED_RESULTS,
+    FRAME_PROMPT_CONCURRENCY,
+    FRAME_PROMPT_MODE,
     GraphState
 )
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)  # Generate a random secret key
-app.config['SESSION_TYPE'] = 'filesystem'
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
 
-# Store the workflow state
-workflow_state = {}
+# Workflow state lives server-side; the session cookie only carries the session id
+state_store = None
+
+# Long-running steps can run as background jobs that the client polls
+job_queue = None
+
+# Opt-in (SPECULATIVE_PREFETCH=1): start the likely next step before the user asks for it
+speculator = None
+SPECULATIVE_WAIT = float(os.getenv('SPECULATIVE_WAIT', '120'))
+
+# Storyboard frames are rendered on a shared, bounded pool
+STORYBOARD_IMAGE_WORKERS = int(os.getenv('STORYBOARD_IMAGE_WORKERS', '6'))
+STORYBOARD_FRAME_TIMEOUT = float(os.getenv('STORYBOARD_FRAME_TIMEOUT', '90'))
+# Regenerate the global themes once at least this share of the scenes changed since the last run
+STORYBOARD_THEMES_REFRESH = float(os.getenv('STORYBOARD_THEMES_REFRESH', '0.5'))
+_IMAGE_EXECUTOR = ThreadPoolExecutor(max_workers=STORYBOARD_IMAGE_WORKERS, thread_name_prefix='storyboard')
+_PROMPT_EXECUTOR = ThreadPoolExecutor(max_workers=FRAME_PROMPT_CONCURRENCY, thread_name_prefix='frame-prompt')
+# Display and thumbnail variants of each frame are encoded on a process pool (None without Pillow)
+image_post_processor = None
+
+_services_started = False
+_SERVICES_LOCK = threading.Lock()
+
+
+def start_services() -> None:
+    """
+    Creates the state store, job queue, speculative executor and image
+    post-processor, and starts warming up the OpenRouter clients. Idempotent.
+
+    Nothing here runs at import: the post-processor's worker processes import
+    this module again (as __mp_main__ under `python app.py`), and must not
+    start a second job queue, heartbeat or warm-up of their own.
+    """
+    global state_store, job_queue, speculator, image_post_processor, _services_started
+    with _SERVICES_LOCK:
+        if _services_started:
+            return
+        state_store = create_state_store()
+        job_queue = create_job_queue()
+        speculator = create_speculative_executor()
+        image_post_processor = create_image_post_processor()
+        # Open pooled OpenRouter connections in the background so the first request is not slowed down
+        if os.getenv('LLM_WARMUP', '1') == '1':
+            threading.Thread(target=warm_up_clients, daemon=True).start()
+        _services_started = True
+
+
+def _load_state(fields=None) -> dict:
+    """Workflow state for the current session; pass `fields` to read only those keys."""
+    session_id = session.get('session_id')
+    if not session_id:
+        return {}
+    return state_store.get(session_id, fields)
 
 
-def _normalize_domain(url: str) -> str:
-    try:
-        parsed = urlparse(url if re.match(r'^https?://', url) else f'https://{url}')
-        host = parsed.netloc.lower()
-        if host.startswith('www.'):
-            host = host[4:]
-        return host
-    except Exception:
-        return ''
-
-
-def _get_brandfetch_api_key():
-    key = os.getenv('BRANDFETCH_API_KEY')
-    if key:
-        return key
-    # Try local files
-    for fname in ['.brandfetch_key', 'brandfetch_api_key.txt', 'brandfetch.key']:
-        if os.path.exists(fname):
-            try:
-                with open(fname, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:
-                        return content
-            except Exception:
-                pass
-    # Fallback: parse research test.py Authorization header if present
-    try:
-        if os.path.exists('research test.py'):
-            with open('research test.py', 'r', encoding='utf-8') as f:
-                text = f.read()
-            m = re.search(r'"Authorization"\s*:\s*"Bearer\s+([^"]+)"', text)
-            if m:
-                return m.group(1)
-    except Exception:
-        pass
-    return None
+def _save_state(values: dict, session_id: str = None) -> None:
+    """Writes the given fields for the session (or `session_id`, for use outside a request)."""
+    state_store.update(session_id or _session_id(), values)
 
 
-def _fetch_brand_from_brandfetch(domain: str):
-    api_key = _get_brandfetch_api_key()
-    if not api_key or not domain:
-        return None
-    try:
-        resp = requests.get(
-            f'https://api.brandfetch.io/v2/brands/{domain}',
-            headers={'Authorization': f'Bearer {api_key}'},
-            timeout=12,
-        )
-        if resp.ok:
-            return resp.json()
-    except Exception:
-        pass
-    return None
+def _session_id() -> str:
+    session_id = session.get('session_id') or uuid4().hex
+    session['session_id'] = session_id
+    return session_id
 
 
-def _fetch_brand_via_transaction(url: str, country_code: str = None):
-    api_key = _get_brandfetch_api_key()
-    if not api_key or not url:
-        return None
-    payload = {
-        "transactionLabel": url,
-    }
-    if country_code:
-        payload["countryCode"] = country_code
-    try:
-        resp = requests.post(
-            'https://api.brandfetch.io/v2/brands/transaction',
-            json=payload,
-            headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
-            timeout=15,
-        )
-        if resp.ok:
-            return resp.json()
-    except Exception:
-        pass
-    return None
+def _wants_job() -> bool:
+    # Clients opt in with {"async": true} in the body or ?async=1
+    return request.args.get('async') == '1' or bool((request.get_json(silent=True) or {}).get('async'))
 
 
-def _scrape_basic_brand_info(url: str, domain: str):
-    info = {
-        'id': domain,
-        'name': domain.split('.')[0].capitalize() if domain else 'Brand',
-        'domain': domain,
-        'description': '',
-        'longDescription': '',
-        'pageTitle': '',
-        'metaDescription': '',
-        'links': [],
-        'logos': [],
-        'colors': [],
-        'fonts': [],
-        'images': [],
-        'qualityScore': 0.0,
-        'company': {},
-        'isNsfw': False,
-        'urn': f'urn:brand:{domain}'
+def _job_accepted(job_id: str):
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job_id,
+        'status_url': url_for('get_job', job_id=job_id)
+    }), 202
+
+
+def _strategy_key(state: dict) -> str:
+    return fingerprint('brand_strategist', projection_inputs('brand_strategist', state))
+
+
+def _script_key(state: dict) -> str:
+    return fingerprint('creation_of_scripts', state.get('selected_concept') or '',
+                       projection_inputs('creation_of_scripts', state))
+
+
+def _take_speculative(session_id: str, node: str, key: str):
+    """The speculative result for `node`, or None if there is none or it is a fallback from a failed call."""
+    return speculator.take(session_id, node, key, SPECULATIVE_WAIT, degraded=DEGRADED_RESULTS.get(node))
+
+
+def _speculate_scripts(session_id: str, state: dict, concepts: list) -> None:
+    # The user will pick one of these concepts next; write a script for each in the background
+    for concept in concepts:
+        concept_state = dict(state, selected_concept=concept['content'])
+        speculator.start(session_id, 'creation_of_scripts', _script_key(concept_state),
+                         creation_of_scripts_node, concept_state)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_response(events) -> Response:
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def _storyboard_filename(scene: dict, index: int) -> str:
+    # Build deterministic, readable filename using scene number and timestamps
+    ts_start = str(scene.get('timestamp_start', '') or '').replace(':', '-').replace(' ', '')
+    ts_end = str(scene.get('timestamp_end', '') or '').replace(':', '-').replace(' ', '')
+    parts = ["scene", str(scene.get('scene_number') or index + 1)]
+    if ts_start or ts_end:
+        parts += [ts_start or 'start', ts_end or 'end']
+    return "_".join(parts) + ".png"
+
+
+def _frame_images(image_url: str = '', variants: dict = None) -> dict:
+    """
+    The image fields of a storyboard entry: the original (kept for export), a
+    compressed display copy, a thumbnail, and a srcset over the thumbnail and
+    display copy. Without variants every field falls back to the original.
+    """
+    variants = variants or {}
+    base_url = image_url.rsplit('/', 1)[0]
+    urls = {name: f"{base_url}/{os.path.basename(v['path'])}" for name, v in variants.items()}
+    srcset = ', '.join(f"{urls[name]} {variants[name]['width']}w" for name in ('thumbnail', 'display') if name in urls)
+    return {
+        'image_url': image_url,
+        'display_url': urls.get('display', image_url),
+        'thumbnail_url': urls.get('thumbnail', image_url),
+        'image_srcset': srcset,
     }
-    if not url:
-        return info
-    try:
-        target = url if re.match(r'^https?://', url) else f'https://{url}'
-        resp = requests.get(target, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
-        if not resp.ok:
-            return info
-        html = resp.text or ''
-        title_match = re.search(r'<title>(.*?)</title>', html, re.IGNORECASE | re.DOTALL)
-        meta_match = re.search(r'<meta[^>]*name=["\"]description["\"][^>]*content=["\"]([^"\"]+)["\"][^>]*>', html, re.IGNORECASE)
-        title = (title_match.group(1).strip() if title_match else '')
-        description = (meta_match.group(1).strip() if meta_match else '')
-        info['pageTitle'] = title
-        info['metaDescription'] = description
-        if title:
-            info['name'] = title.split('|')[0].split('—')[0].strip()
-        if description:
-            info['description'] = description
-            info['longDescription'] = description
-        return info
-    except Exception:
-        return info
 
 
-def _load_local_brand(domain: str):
-    # Try domain-based JSON file for quick demos; fallback to anthopic.json
+def _render_storyboard_frame(prompt_text: str, scene: dict, index: int, base_dir: str, session_id: str) -> dict:
+    """Generate one storyboard image, write it and its variants to disk and return their URLs ('' on failure)."""
     try:
-        if domain and os.path.exists(f'{domain}.json'):
-            with open(f'{domain}.json', 'r', encoding='utf-8') as f:
-                try:
-                    return json.load(f)
-                except json.JSONDecodeError:
-                    # Some demo files may be Python dicts -> try eval safely
-                    import ast
-                    f.seek(0)
-                    return ast.literal_eval(f.read())
+        # Unchanged prompts are linked from the image store instead of being generated again
+        filename = _storyboard_filename(scene, index)
+        path = os.path.join(base_dir, filename)
+        saved = save_image_with_style(prompt_text, "Photorealistic", path, timeout=STORYBOARD_FRAME_TIMEOUT)
+        if not saved:
+            return _frame_images()
+        variants = image_post_processor.process(path, STORYBOARD_FRAME_TIMEOUT) if image_post_processor else {}
+        return _frame_images(f"/static/generated/storyboards/{session_id}/{filename}", variants)
     except Exception:
-        pass
-    try:
-        with open('anthopic.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return {}
+        return _frame_images()
+
+
+@app.before_request
+def _ensure_services():
+    # Covers WSGI servers that import the app instead of running this file
+    start_services()
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Streaming responses are timed until their headers are returned
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                     status=response.status_code)
+    return response
+
+
+@app.errorhandler(LLMError)
+def handle_llm_error(e):
+    """Model requests that still fail after retries surface as 502/503 JSON errors."""
+    status = 503 if isinstance(e, LLMRateLimitError) or e.retryable else 502
+    response = jsonify({'status': 'error', 'error': type(e).__name__, 'message': str(e)})
+    response.status_code = status
+    if e.retry_after:
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+    return response
+
+
+def _sse_error(e: LLMError) -> str:
+    return _sse('error', {'error': type(e).__name__, 'message': str(e)})
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/')
@@ -178,7 +253,7 @@ def analyze_url():
     """Process the URL and start the workflow"""
     data = request.json
     url = (data or {}).get('url') or ''
-    domain = _normalize_domain(url)
+    domain = normalize_domain(url)
 
     # Initialize state
     state = {
@@ -196,34 +271,19 @@ def analyze_url():
         'global_themes_and_figures': {}
     }
 
-    # Prefer Brandfetch API if available; else scrape; else local fallback
-    # 1) Try Brandfetch transaction (more robust for full URLs)
-    company_info = _fetch_brand_via_transaction(url, os.getenv('BRANDFETCH_COUNTRY') or None)
-    # 2) Fallback to simple Brandfetch by domain
-    if not company_info:
-        company_info = _fetch_brand_from_brandfetch(domain)
-    if not company_info:
-        company_info = _scrape_basic_brand_info(url, domain)
-    if not company_info:
-        company_info = _load_local_brand(domain)
-
-    # Always try to enrich with page meta
-    try:
-        meta = _scrape_basic_brand_info(url, domain)
-        if isinstance(company_info, dict) and isinstance(meta, dict):
-            if not company_info.get('pageTitle') and meta.get('pageTitle'):
-                company_info['pageTitle'] = meta.get('pageTitle')
-            if not company_info.get('metaDescription') and meta.get('metaDescription'):
-                company_info['metaDescription'] = meta.get('metaDescription')
-    except Exception:
-        pass
+    # Brandfetch (transaction and domain) and the page scrape run concurrently; cached per domain
+    company_info = fetch_brand_info(url, domain)
 
     state['company_info'] = company_info
 
-    # Store in session
-    if 'session_id' not in session:
-        session['session_id'] = uuid4().hex
-    session['workflow_state'] = state
+    # Start the session's state afresh; the cookie only keeps the id
+    session_id = _session_id()
+    state_store.delete(session_id)
+    speculator.discard(session_id)
+    state_store.purge_expired(app.config['PERMANENT_SESSION_LIFETIME'])
+    job_queue.store.purge(app.config['PERMANENT_SESSION_LIFETIME'])
+    _save_state(state, session_id)
+    speculator.start(session_id, 'brand_strategist', _strategy_key(state), brand_strategist_node, state)
 
     return jsonify({'status': 'success', 'company_info': state['company_info'], 'domain': domain})
 
@@ -231,16 +291,16 @@ def analyze_url():
 @app.route('/api/brand-strategy', methods=['POST'])
 def generate_brand_strategy():
     """Generate brand strategy"""
-    state = session.get('workflow_state', {})
+    state = _load_state()
+    session_id = _session_id()
 
-    # Run brand strategist
-    result = brand_strategist_node(state)
-    state.update(result)
+    # Run brand strategist, unless it already ran speculatively on the same inputs
+    result = (_take_speculative(session_id, 'brand_strategist', _strategy_key(state))
+              or brand_strategist_node(state))
+    _save_state(result, session_id)
 
     # Parse the brand strategy output
-    strategy_text = state['summary_plan_audience']
-
-    session['workflow_state'] = state
+    strategy_text = result['summary_plan_audience']
 
     return jsonify({
         'status': 'success',
@@ -252,7 +312,7 @@ def generate_brand_strategy():
 @app.route('/api/creative-concepts', methods=['POST'])
 def generate_creative_concepts():
     """Generate 4 creative video ideas"""
-    state = session.get('workflow_state', {})
+    state = _load_state()
 
     # Run creative director
     result = creative_director_node(state)
@@ -271,13 +331,14 @@ def generate_creative_concepts():
                 'content': concept.strip()
             })
 
-    # Persist concepts for later selection
-    state['structured_concepts'] = structured_concepts
-    # Clear any previous selection upon regeneration
-    state['selected_concept_id'] = None
-    state['selected_concept'] = None
-
-    session['workflow_state'] = state
+    # Persist concepts for later selection and clear any previous selection upon regeneration
+    _save_state({
+        'creative_director_node': concepts_text,
+        'structured_concepts': structured_concepts,
+        'selected_concept_id': None,
+        'selected_concept': None,
+    })
+    _speculate_scripts(_session_id(), state, structured_concepts)
 
     return jsonify({
         'status': 'success',
@@ -285,19 +346,96 @@ def generate_creative_concepts():
     })
 
 
+@app.route('/api/brand-strategy/stream', methods=['POST'])
+def generate_brand_strategy_stream():
+    """Generate brand strategy, streaming the text as Server-Sent Events"""
+    state = _load_state()
+    session_id = _session_id()
+
+    def generate():
+        parts = []
+        prefetched = _take_speculative(session_id, 'brand_strategist', _strategy_key(state))
+        deltas = [prefetched['summary_plan_audience']] if prefetched else brand_strategist_stream(state)
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield _sse('delta', {'text': delta})
+        except LLMError as e:
+            yield _sse_error(e)
+            return
+        strategy_text = ''.join(parts)
+        _save_state({'summary_plan_audience': strategy_text}, session_id)
+        yield _sse('done', {'strategy': strategy_text, 'raw_output': strategy_text})
+
+    return _sse_response(generate())
+
+
+@app.route('/api/creative-concepts/stream', methods=['POST'])
+def generate_creative_concepts_stream():
+    """Generate 4 creative video ideas, sending each concept as soon as its '§' delimiter arrives"""
+    state = _load_state()
+    session_id = _session_id()
+
+    def generate():
+        buffer = ''
+        segment_index = 0
+        structured_concepts = []
+
+        def _emit(segment, index):
+            if segment.strip():
+                concept = {'id': index + 1, 'content': segment.strip()}
+                structured_concepts.append(concept)
+                return _sse('concept', concept)
+            return None
+
+        parts = []
+        try:
+            for delta in creative_director_stream(state):
+                parts.append(delta)
+                buffer += delta
+                yield _sse('delta', {'text': delta})
+                # Every completed segment is a finished concept card
+                while '§' in buffer:
+                    segment, buffer = buffer.split('§', 1)
+                    event = _emit(segment, segment_index)
+                    segment_index += 1
+                    if event:
+                        yield event
+        except LLMError as e:
+            yield _sse_error(e)
+            return
+        event = _emit(buffer, segment_index)
+        if event:
+            yield event
+
+        # Persist concepts and clear any previous selection upon regeneration
+        concepts_text = ''.join(parts)
+        _save_state({
+            'creative_director_node': concepts_text,
+            'structured_concepts': structured_concepts,
+            'selected_concept_id': None,
+            'selected_concept': None,
+        }, session_id)
+        _speculate_scripts(session_id, dict(state, creative_director_node=concepts_text), structured_concepts)
+        yield _sse('done', {'concepts': structured_concepts})
+
+    return _sse_response(generate())
+
+
 @app.route('/api/regenerate-concepts', methods=['POST'])
 def regenerate_concepts():
     """Regenerate creative concepts based on user feedback"""
     data = request.json
     feedback = data.get('feedback', '')
 
-    state = session.get('workflow_state', {})
+    state = _load_state()
 
     # Add feedback to state
     state['br_feedback_result'] = feedback
 
-    # Re-run creative director with feedback
-    result = creative_director_node(state)
+    # Re-run creative director with feedback; never serve a cached completion for a regenerate
+    with bypass_completion_cache():
+        result = creative_director_node(state)
     state.update(result)
 
     # Parse the creative concepts
@@ -313,11 +451,14 @@ def regenerate_concepts():
             })
 
     # Persist and clear selection on regeneration
-    state['structured_concepts'] = structured_concepts
-    state['selected_concept_id'] = None
-    state['selected_concept'] = None
-
-    session['workflow_state'] = state
+    _save_state({
+        'br_feedback_result': feedback,
+        'creative_director_node': concepts_text,
+        'structured_concepts': structured_concepts,
+        'selected_concept_id': None,
+        'selected_concept': None,
+    })
+    _speculate_scripts(_session_id(), state, structured_concepts)
 
     return jsonify({
         'status': 'success',
@@ -332,39 +473,60 @@ def select_concept():
     concept_id = data.get('concept_id')
     content = data.get('content')
 
-    state = session.get('workflow_state', {})
     # Save selection
-    state['selected_concept_id'] = concept_id
+    selection = {'selected_concept_id': concept_id}
     if content:
-        state['selected_concept'] = content
+        selection['selected_concept'] = content
     else:
-        for c in state.get('structured_concepts', []):
+        for c in _load_state(['structured_concepts']).get('structured_concepts', []):
             if c.get('id') == concept_id:
-                state['selected_concept'] = c.get('content')
+                selection['selected_concept'] = c.get('content')
                 break
     # Mark user approval for next step
-    state['user_happy'] = True
+    selection['user_happy'] = True
 
-    session['workflow_state'] = state
+    _save_state(selection)
 
     return jsonify({'status': 'success'})
 
 
-@app.route('/api/generate-script', methods=['POST'])
-def generate_script():
-    """Generate the video script"""
-    state = session.get('workflow_state', {})
+def _scene_reporter(report):
+    # Job pollers see each scene as soon as the model has finished writing it
+    scenes = []
 
-    # Run script creation (uses selected_concept from state)
-    result = creation_of_scripts_node(state)
-    state.update(result)
+    def on_scene(scene):
+        scenes.append(scene)
+        report({'stage': 'creation_of_scripts', 'scenes': len(scenes)}, {'script': list(scenes)})
+    return on_scene
 
-    session['workflow_state'] = state
 
-    return jsonify({
+def _run_script(session_id: str, report=None) -> dict:
+    state = state_store.get(session_id)
+    if report:
+        report({'stage': 'creation_of_scripts'})
+
+    on_scene = _scene_reporter(report) if report else None
+
+    # Run script creation (uses selected_concept from state), unless it already ran speculatively
+    result = (_take_speculative(session_id, 'creation_of_scripts', _script_key(state))
+              or creation_of_scripts_node(state, on_scene=on_scene))
+    _save_state(result, session_id)
+
+    return {
         'status': 'success',
-        'script': state['scripts_created']
-    })
+        'script': result['scripts_created']
+    }
+
+
+@app.route('/api/generate-script', methods=['POST'])
+def generate_script():
+    """Generate the video script (as a background job when requested)"""
+    session_id = _session_id()
+    if _wants_job():
+        job_id = job_queue.submit('generate-script', lambda job: _run_script(session_id, job.report),
+                                  session_id=session_id)
+        return _job_accepted(job_id)
+    return jsonify(_run_script(session_id))
 
 
 @app.route('/api/update-script', methods=['POST'])
@@ -373,22 +535,13 @@ def update_script():
     data = request.json
     updated_script = data.get('script')
 
-    state = session.get('workflow_state', {})
-    state['scripts_created'] = updated_script
-
-    session['workflow_state'] = state
+    _save_state({'scripts_created': updated_script})
 
     return jsonify({'status': 'success'})
 
 
-@app.route('/api/generate-storyboard', methods=['POST'])
-def generate_storyboard():
-    """Generate storyboard frames"""
-    state = session.get('workflow_state', {})
-
-    # Run global themes generation
+def _normalize_scenes(raw_script):
     # Normalize scripts_created to ensure we have scenes
-    raw_script = state.get('scripts_created', {})
     scenes = []
     try:
         if isinstance(raw_script, str):
@@ -402,68 +555,254 @@ def generate_storyboard():
             scenes = raw_script
     except Exception:
         scenes = []
+    return scenes
+
+
+def _storyboard_entry(scene: dict, prompt_text: str = '', image_url: str = '') -> dict:
+    return {
+        'scene_number': scene.get('scene_number'),
+        'timestamp': f"{scene.get('timestamp_start')} - {scene.get('timestamp_end')}",
+        'setting': scene.get('setting'),
+        'visual_description': scene.get('visual_description'),
+        'text_on_screen': scene.get('text_on_screen'),
+        'audio_cue': scene.get('audio_cue'),
+        'image_prompt': prompt_text,
+        **_frame_images(image_url),
+    }
 
-    # If normalization found scenes, place back into state consistently
-    if scenes:
-        state['scripts_created'] = {'script': scenes}
 
-    result = generate_global_themes_node(state)
-    state.update(result)
+def _normalize_text(value) -> str:
+    return ' '.join(str(value or '').split()).casefold()
 
-    # Run frame prompts generation
-    result = generate_frame_prompts_node(state)
-    state.update(result)
 
-    session['workflow_state'] = state
+def _scene_key(scene: dict) -> str:
+    # A frame only depends on its scene's setting and visual description (and the global themes)
+    return fingerprint(_normalize_text(scene.get('setting')), _normalize_text(scene.get('visual_description')))
 
-    # Combine script scenes with frame prompts
-    scenes = state.get('scripts_created', {}).get('script', [])
-    prompts = state['frame_prompts']
 
-    storyboard = []
+def _themes_version(themes: dict) -> str:
+    return fingerprint((themes or {}).get('global_theme', ''), (themes or {}).get('global_figures', ''))
+
+
+def _frame_key(scene_key: str, themes_version: str) -> str:
+    return fingerprint(scene_key, themes_version)
+
+
+def _themes_still_valid(previous: dict, scene_keys: list, state: dict) -> bool:
+    """
+    Whether the themes from the last run can be kept: they are the ones that
+    run fingerprinted (not the failure placeholder) and less than
+    STORYBOARD_THEMES_REFRESH of the scenes were added, removed or rewritten.
+    """
+    themes = state.get('global_themes_and_figures')
+    old_keys = previous.get('scenes')
+    if not old_keys or is_fallback_themes(themes) or previous.get('themes_version') != _themes_version(themes):
+        return False
+    changed = len(set(old_keys) ^ set(scene_keys)) / (len(old_keys) + len(scene_keys))
+    return changed < STORYBOARD_THEMES_REFRESH
+
+
+def _iter_storyboard_events(state: dict, session_id: str):
+    """
+    Runs the storyboard pipeline for `state`, yielding (event, data) pairs as work completes.
+
+    Events, in order: 'themes' once the global themes are ready (with a storyboard
+    skeleton), 'prompt' per scene as its frame prompt arrives, 'frame' per scene as
+    its image file is written, and finally 'done' with the full storyboard. Each
+    image starts rendering as soon as its own prompt is ready. `state` is updated
+    in place with the themes, frame prompts and storyboard fingerprints.
+
+    Work from the previous run is reused: the themes are kept unless a large
+    share of the scenes changed (STORYBOARD_THEMES_REFRESH), and scenes whose
+    setting and visual description are unchanged keep their prompt, so their
+    image is linked from the image store instead of being generated again.
+    Editing one scene therefore re-renders just that frame.
+    """
+    # If normalization found scenes, place back into state consistently
+    scenes = _normalize_scenes(state.get('scripts_created', {}))
+    if scenes:
+        state['scripts_created'] = {'script': scenes}
+    previous = state.get('storyboard_fingerprints') or {}
+
+    # Run global themes generation, unless most scenes are the same as last time
+    scene_keys = [_scene_key(scene) for scene in scenes]
+    reused_themes = bool(scenes) and _themes_still_valid(previous, scene_keys, state)
+    if not reused_themes:
+        result = generate_global_themes_node(state)
+        state.update(result)
+    storyboard = [_storyboard_entry(scene) for scene in scenes]
+    yield 'themes', {'global_themes_and_figures': state.get('global_themes_and_figures', {}), 'storyboard': storyboard,
+                     'reused': reused_themes}
+
     # Prepare output directory for generated images
-    session_id = session.get('session_id') or uuid4().hex
-    session['session_id'] = session_id
     base_dir = os.path.join('static', 'generated', 'storyboards', session_id)
     os.makedirs(base_dir, exist_ok=True)
 
-    for i, scene in enumerate(scenes):
-        image_url = ''
-        prompt_text = prompts[i] if i < len(prompts) else ''
-        # Try to generate an image and save it
+    global_data = state.get('global_themes_and_figures', {}) or {}
+    global_theme = global_data.get('global_theme', '')
+    global_figures = global_data.get('global_figures', '')
+    prompts = [''] * len(scenes)
+    themes_version = _themes_version(global_data)
+    frame_keys = [_frame_key(key, themes_version) for key in scene_keys]
+    known_prompts = previous.get('frames') or {}
+    events = queue.Queue()
+
+    def _on_frame(index, future):
         try:
-            if prompt_text:
-                img_bytes = generate_image_with_style(prompt_text, style="Photorealistic")
-                if img_bytes:
-                    # Build deterministic, readable filename using scene number and timestamps
-                    ts_start = str(scene.get('timestamp_start', '') or '').replace(':', '-').replace(' ', '')
-                    ts_end = str(scene.get('timestamp_end', '') or '').replace(':', '-').replace(' ', '')
-                    parts = ["scene", str(scene.get('scene_number') or i + 1)]
-                    if ts_start or ts_end:
-                        parts += [ts_start or 'start', ts_end or 'end']
-                    filename = "_".join(parts) + ".png"
-                    filepath = os.path.join(base_dir, filename)
-                    with open(filepath, 'wb') as f:
-                        f.write(img_bytes)
-                    image_url = f"/static/generated/storyboards/{session_id}/{filename}"
+            events.put(('frame', index, future.result()))
         except Exception:
-            image_url = ''
-
-        storyboard.append({
-            'scene_number': scene.get('scene_number'),
-            'timestamp': f"{scene.get('timestamp_start')} - {scene.get('timestamp_end')}",
-            'setting': scene.get('setting'),
-            'visual_description': scene.get('visual_description'),
-            'text_on_screen': scene.get('text_on_screen'),
-            'audio_cue': scene.get('audio_cue'),
-            'image_prompt': prompt_text,
-            'image_url': image_url
-        })
+            events.put(('frame', index, _frame_images()))
+
+    def _start_frame(index, prompt_text):
+        events.put(('prompt', index, prompt_text))
+        if not prompt_text:
+            events.put(('frame', index, _frame_images()))
+            return
+        # Render this frame right away instead of waiting for the remaining prompts
+        frame_future = _IMAGE_EXECUTOR.submit(
+            _render_storyboard_frame, prompt_text, scenes[index], index, base_dir, session_id
+        )
+        frame_future.add_done_callback(lambda f: _on_frame(index, f))
 
-    return jsonify({
+    def _on_prompt(index, future):
+        try:
+            prompt_text = future.result()
+        except Exception:
+            prompt_text = ''
+        _start_frame(index, prompt_text)
+
+    # Unchanged scenes keep their prompt; only the rest go to the model
+    changed = []
+    for i, key in enumerate(frame_keys):
+        if known_prompts.get(key):
+            _start_frame(i, known_prompts[key])
+        else:
+            changed.append(i)
+
+    def _on_batch(future):
+        try:
+            batch = future.result()
+        except Exception:
+            batch = []
+        for position, index in enumerate(changed):
+            _start_frame(index, batch[position] if position < len(batch) else '')
+
+    if changed and FRAME_PROMPT_MODE == 'batched':
+        # One request for every changed scene; frames start together once the reply is in
+        batch_future = _PROMPT_EXECUTOR.submit(generate_frame_prompts, [scenes[i] for i in changed],
+                                               global_theme, global_figures)
+        batch_future.add_done_callback(_on_batch)
+    else:
+        for i in changed:
+            prompt_future = _PROMPT_EXECUTOR.submit(generate_frame_prompt, scenes[i], global_theme, global_figures)
+            prompt_future.add_done_callback(lambda f, i=i: _on_prompt(i, f))
+
+    pending_frames = len(scenes)
+    while pending_frames:
+        try:
+            # Each wait is bounded so a stuck request cannot hold the stream open forever
+            kind, index, value = events.get(timeout=STORYBOARD_FRAME_TIMEOUT + 5)
+        except queue.Empty:
+            break
+        if kind == 'prompt':
+            prompts[index] = value
+            storyboard[index]['image_prompt'] = value
+            yield 'prompt', {'index': index, 'scene_number': scenes[index].get('scene_number'), 'image_prompt': value,
+                             'reused': index not in changed}
+        else:
+            pending_frames -= 1
+            storyboard[index].update(value)
+            yield 'frame', {'index': index, 'scene_number': scenes[index].get('scene_number'), **value}
+
+    state['frame_prompts'] = prompts
+    state['storyboard_fingerprints'] = {
+        # Placeholder themes from a failed call are not recorded, so the next run asks again
+        'scenes': [] if is_fallback_themes(global_data) else scene_keys,
+        'themes_version': themes_version,
+        'frames': {key: prompt for key, prompt in zip(frame_keys, prompts) if prompt},
+    }
+    if os.getenv('DEBUG_LLM') == '1':
+        print(f"Storyboard: {len(scenes) - len(changed)} of {len(scenes)} frame(s) reused"
+              + ("; global themes reused" if reused_themes else ""))
+    yield 'done', {'storyboard': storyboard}
+
+
+def _frame_images_of(data: dict) -> dict:
+    return {key: data[key] for key in ('image_url', 'display_url', 'thumbnail_url', 'image_srcset') if key in data}
+
+
+def _storyboard_state(state: dict) -> dict:
+    # The fields _iter_storyboard_events updates
+    return {key: state.get(key) for key in ('scripts_created', 'global_themes_and_figures', 'frame_prompts',
+                                            'storyboard_fingerprints')}
+
+
+def _run_storyboard(session_id: str, report=None) -> dict:
+    state = state_store.get(session_id)
+
+    if report:
+        report({'stage': 'global_themes'})
+
+    storyboard = []
+    frames_done = 0
+    for event, data in _iter_storyboard_events(state, session_id):
+        if event == 'themes':
+            storyboard = data['storyboard']
+        elif event == 'prompt':
+            storyboard[data['index']]['image_prompt'] = data['image_prompt']
+        elif event == 'frame':
+            frames_done += 1
+            storyboard[data['index']].update(_frame_images_of(data))
+        else:
+            storyboard = data['storyboard']
+        if report and event != 'done':
+            report({'stage': 'frames', 'frames_done': frames_done, 'frames_total': len(storyboard)}, storyboard)
+
+    _save_state(_storyboard_state(state), session_id)
+
+    return {
         'status': 'success',
         'storyboard': storyboard
-    })
+    }
+
+
+@app.route('/api/generate-storyboard', methods=['POST'])
+def generate_storyboard():
+    """Generate storyboard frames (as a background job when requested)"""
+    session_id = _session_id()
+    if _wants_job():
+        job_id = job_queue.submit('generate-storyboard', lambda job: _run_storyboard(session_id, job.report),
+                                  session_id=session_id)
+        return _job_accepted(job_id)
+    return jsonify(_run_storyboard(session_id))
+
+
+@app.route('/api/generate-storyboard/stream', methods=['POST'])
+def generate_storyboard_stream():
+    """Generate storyboard frames, streaming progress as Server-Sent Events"""
+    state = _load_state()
+    session_id = _session_id()
+
+    def generate():
+        try:
+            for event, data in _iter_storyboard_events(state, session_id):
+                yield _sse(event, data)
+        except LLMError as e:
+            yield _sse_error(e)
+            return
+        _save_state(_storyboard_state(state), session_id)
+
+    return _sse_response(generate())
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Status, progress, partial results and the final result of a background job"""
+    job = job_queue.store.get(job_id)
+    if job is None or job['session_id'] != session.get('session_id'):
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    job.pop('session_id')
+    return jsonify(job)
 
 
 @app.route('/api/generate-video', methods=['POST'])
@@ -522,5 +861,8 @@ def video_page():
 
 
 if __name__ == '__main__':
+    # The debug reloader's watcher process only restarts the server; services start in the one that serves
+    if is_running_from_reloader():
+        start_services()
     app.run(debug=True, port=5000)
 
@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from brand_sources import normalize_domain
+from main import build_workflow, is_url, run_workflow
+from memo import create_node_memo
+from metrics import track_usage
+
+
+STATUS_FILE = "status.json"
+SUMMARY_FILE = "summary.json"
+
+
+def load_manifest(path: str) -> list:
+    """
+    Reads a JSONL manifest with one brand per line: {"source": "<brand JSON file or URL>", "name": "<optional>"}.
+
+    A bare JSON string per line is accepted as the source. Names default to the
+    URL's domain or the file name and are made unique.
+    """
+    brands = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {"source": entry}
+            source = entry.get("source") or entry.get("url") or entry.get("file")
+            if not source:
+                raise ValueError(f"{path}:{line_number}: brand entry has no source")
+            if not is_url(source) and not os.path.isabs(source):
+                # Brand files are relative to the manifest
+                source = os.path.join(os.path.dirname(os.path.abspath(path)), source)
+            name = entry.get("name") or (normalize_domain(source) if is_url(source)
+                                         else os.path.splitext(os.path.basename(source))[0])
+            name = re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("._") or "brand"
+            unique, n = name, 2
+            while unique in seen:
+                unique, n = f"{name}_{n}", n + 1
+            seen.add(unique)
+            brands.append({"name": unique, "source": source})
+    return brands
+
+
+def _read_status(brand_dir: str) -> dict:
+    try:
+        with open(os.path.join(brand_dir, STATUS_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_status(brand_dir: str, status: dict) -> None:
+    tmp_path = os.path.join(brand_dir, f"{STATUS_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f, indent=4)
+    os.replace(tmp_path, os.path.join(brand_dir, STATUS_FILE))
+
+
+def run_brand(compiled, brand: dict, out_dir: str) -> dict:
+    """Runs the workflow for one brand into out_dir/<name>, resuming its last unfinished run if there is one."""
+    brand_dir = os.path.join(out_dir, brand["name"])
+    os.makedirs(brand_dir, exist_ok=True)
+    previous = _read_status(brand_dir)
+    # A failed run, or one whose process died ("running"), continues from its checkpoint
+    resume = (previous.get("status") in ("failed", "running") and previous.get("source") == brand["source"]
+              and bool(compiled.get_state({"configurable": {"thread_id": previous.get("run_id")}}).values))
+    run_id = previous["run_id"] if resume else f"{brand['name']}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+    status = {"name": brand["name"], "source": brand["source"], "run_id": run_id, "status": "running"}
+    _write_status(brand_dir, status)
+    started = time.perf_counter()
+    with track_usage() as usage:
+        try:
+            run_workflow(compiled, run_id, resume=resume, out_dir=brand_dir, inputs={"brand_source": brand["source"]})
+            status["status"] = "succeeded"
+            status["error"] = None
+        except Exception as e:
+            status["status"] = "failed"
+            status["error"] = str(e) or e.__class__.__name__
+    status["seconds"] = round(time.perf_counter() - started, 2)
+    status.update(usage)
+    _write_status(brand_dir, status)
+    return status
+
+
+def run_batch(manifest: str, out_dir: str, workers: int = 4, force: bool = False, memo=None) -> dict:
+    """Runs every brand in `manifest` on a worker pool and writes out_dir/summary.json."""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    brands = load_manifest(manifest)
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+    pending = []
+    for brand in brands:
+        previous = _read_status(os.path.join(out_dir, brand["name"]))
+        if not force and previous.get("status") == "succeeded" and previous.get("source") == brand["source"]:
+            results[brand["name"]] = dict(previous, skipped=True)
+        else:
+            pending.append(brand)
+    print(f"{len(brands)} brand(s) in manifest: {len(pending)} to run, {len(brands) - len(pending)} already finished")
+
+    started = time.perf_counter()
+    print_lock = threading.Lock()
+    with SqliteSaver.from_conn_string(os.path.join(out_dir, "checkpoints.sqlite")) as checkpointer:
+        # One compiled graph serves every brand; runs are kept apart by their thread id
+        compiled = build_workflow(memo).compile(checkpointer=checkpointer)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+            futures = {executor.submit(run_brand, compiled, brand, out_dir): brand for brand in pending}
+            for future in as_completed(futures):
+                status = future.result()
+                results[status["name"]] = status
+                with print_lock:
+                    print(f"[{status['status']}] {status['name']} in {status['seconds']:.1f}s"
+                          + (f": {status['error']}" if status.get("error") else ""))
+
+    ordered = [results[brand["name"]] for brand in brands]
+    summary = {
+        "manifest": os.path.abspath(manifest),
+        "seconds": round(time.perf_counter() - started, 2),
+        "brands": len(brands),
+        "succeeded": sum(1 for r in ordered if r.get("status") == "succeeded"),
+        "failed": sum(1 for r in ordered if r.get("status") == "failed"),
+        "skipped": sum(1 for r in ordered if r.get("skipped")),
+        "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in ordered if not r.get("skipped")),
+        "completion_tokens": sum(r.get("completion_tokens", 0) for r in ordered if not r.get("skipped")),
+        "results": ordered,
+    }
+    with open(os.path.join(out_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline FrameAgent workflow for every brand in a JSONL manifest.")
+    parser.add_argument("manifest", help="JSONL file with one {\"source\": ..., \"name\": ...} entry per line")
+    parser.add_argument("--out-dir", default="batch_output", help="directory for per-brand outputs and summary.json")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('BATCH_WORKERS', '4')),
+                        help="brands processed concurrently")
+    parser.add_argument("--force", action="store_true", help="rerun brands that already finished")
+    parser.add_argument("--no-memo", action="store_true", help="recompute every node instead of reusing stored results")
+    args = parser.parse_args()
+
+    summary = run_batch(args.manifest, args.out_dir, workers=args.workers, force=args.force,
+                        memo=None if args.no_memo else create_node_memo())
+    print(f"\nBatch finished in {summary['seconds']:.1f}s: {summary['succeeded']} succeeded, "
+          f"{summary['failed']} failed, {summary['skipped']} skipped; "
+          f"{summary['prompt_tokens']} prompt / {summary['completion_tokens']} completion tokens")
+    print(f"Summary written to {os.path.join(args.out_dir, SUMMARY_FILE)}")
+    if summary['failed']:
+        raise SystemExit(1)
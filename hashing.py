@@ -0,0 +1,8 @@
+import hashlib
+import json
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of JSON-serialisable inputs, for cache and reuse keys."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import shutil
+import threading
+from typing import Optional
+
+
+class ImageStore:
+    """
+    Content-addressed store for generated images.
+
+    Each (backend, model, full prompt, style) combination maps to one PNG under
+    `root`.
+    Session directories hard-link to the stored file (or get a copy when linking
+    is not possible), so an unchanged frame is never generated twice. Once the
+    store exceeds `max_bytes`, the least recently used images are evicted.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 500 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key_for(base_url: str, model: str, full_prompt: str, style: str) -> str:
+        digest = hashlib.sha256()
+        for part in (base_url, model, full_prompt, style):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def _touch(self, path: str) -> bool:
+        # The mtime doubles as the last-access time used for LRU eviction
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.path_for(key)
+        if not self._touch(path):
+            self.misses += 1
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def link(self, key: str, dest_path: str, record: bool = True) -> bool:
+        """Places the stored image for `key` at `dest_path`. Returns False if the image is not stored."""
+        path = self.path_for(key)
+        if not self._touch(path):
+            if record:
+                self.misses += 1
+            return False
+        try:
+            if os.path.lexists(dest_path):
+                os.remove(dest_path)
+            try:
+                os.link(path, dest_path)
+            except OSError:
+                # Different filesystem or no hard-link support
+                shutil.copyfile(path, dest_path)
+        except OSError:
+            if record:
+                self.misses += 1
+            return False
+        if record:
+            self.hits += 1
+        return True
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if not name.endswith('.png'):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,117 @@
+import glob
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+
+def _digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def make_variants(src_path: str, display_width: int = 1024, thumb_width: int = 320, quality: int = 80) -> dict:
+    """
+    Writes a compressed display copy and a thumbnail next to `src_path` and
+    returns their paths and widths. Runs in a worker process.
+
+    Variant names carry a digest of the source bytes, so a regenerated frame
+    gets fresh URLs (nothing stale from the browser cache) while an unchanged
+    one reuses the files already on disk. WebP is used when Pillow supports
+    it, JPEG otherwise; the original is left untouched for export.
+    """
+    from PIL import Image, features
+
+    fmt, ext = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+    stem = os.path.splitext(src_path)[0]
+    digest = _digest(src_path)
+    variants = {}
+    with Image.open(src_path) as image:
+        for name, width in (('display', display_width), ('thumbnail', thumb_width)):
+            width = min(width, image.width)
+            path = f"{stem}.{name}.{digest}.{ext}"
+            variants[name] = {'path': path, 'width': width}
+            if os.path.exists(path):
+                continue
+            # Variants of an earlier version of this frame are no longer referenced
+            for stale in glob.glob(f"{glob.escape(stem)}.{name}.*.{ext}"):
+                os.remove(stale)
+            # Generated frames can come back as RGBA or palette images; neither JPEG nor lossy WebP needs alpha
+            source = image if image.mode in ('RGB', 'L') else image.convert('RGB')
+            resized = source if width == image.width else source.resize(
+                (width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            if fmt == 'WEBP':
+                resized.save(tmp_path, fmt, quality=quality, method=4)
+            else:
+                resized.save(tmp_path, fmt, quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, path)
+    return variants
+
+
+class ImagePostProcessor:
+    """
+    Produces display and thumbnail variants of generated images on a process
+    pool, keeping Pillow's decode/resize/encode work off the request threads
+    (and out of the GIL). The pool is started on first use.
+    """
+
+    def __init__(self, workers: int = 2, display_width: int = 1024, thumb_width: int = 320, quality: int = 80):
+        self.workers = workers
+        self.display_width = display_width
+        self.thumb_width = thumb_width
+        self.quality = quality
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a process that is running Flask, LLM and job threads can copy a held lock into the child
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def process(self, src_path: str, timeout: Optional[float] = None) -> dict:
+        """Variants of `src_path` as {name: {'path', 'width'}}, or {} if they could not be made."""
+        try:
+            future = self._pool().submit(make_variants, src_path, self.display_width, self.thumb_width, self.quality)
+            return future.result(timeout=timeout)
+        except Exception as e:
+            if os.getenv('DEBUG_LLM') == '1':
+                print(f"Image post-processing failed for {src_path}: {e}")
+            return {}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def create_image_post_processor() -> Optional[ImagePostProcessor]:
+    """
+    Builds the post-processor from STORYBOARD_POSTPROCESS (default on; '0'
+    disables), STORYBOARD_POSTPROCESS_WORKERS, STORYBOARD_DISPLAY_WIDTH,
+    STORYBOARD_THUMB_WIDTH and STORYBOARD_IMAGE_QUALITY. Returns None when it
+    is disabled or Pillow is not installed; frames are then served as generated.
+    """
+    if os.getenv('STORYBOARD_POSTPROCESS', '1') != '1':
+        return None
+    if importlib.util.find_spec('PIL') is None:
+        if os.getenv('DEBUG_LLM') == '1':
+            print("Pillow is not installed; storyboard frames are served without thumbnails")
+        return None
+    return ImagePostProcessor(
+        workers=int(os.getenv('STORYBOARD_POSTPROCESS_WORKERS', '2')),
+        display_width=int(os.getenv('STORYBOARD_DISPLAY_WIDTH', '1024')),
+        thumb_width=int(os.getenv('STORYBOARD_THUMB_WIDTH', '320')),
+        quality=int(os.getenv('STORYBOARD_IMAGE_QUALITY', '80')),
+    )
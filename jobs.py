@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from uuid import uuid4
+
+
+# Job statuses, in lifecycle order
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+
+class JobStore:
+    """
+    Job records stored in a local SQLite file.
+
+    Status, progress, partial results and the final result are written as the
+    job runs, so any worker process on the host can answer a poll and finished
+    jobs stay readable after a restart.
+
+    Each job records the worker (one per JobQueue, i.e. per process) that owns
+    it, and workers keep a heartbeat in the `workers` table. Unfinished jobs
+    whose owner stopped beating died with it and are failed by fail_orphaned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " session_id TEXT,"
+                " status TEXT NOT NULL,"
+                " progress TEXT,"
+                " partial TEXT,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if 'owner' not in columns:
+                # Stores created before jobs had owners
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            conn.execute("CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, kind: str, session_id: Optional[str] = None, owner: Optional[str] = None) -> str:
+        job_id = uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, session_id, status, owner, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, session_id, QUEUED, owner, now, now),
+            )
+        return job_id
+
+    def update(self, job_id: str, **values) -> None:
+        """Sets any of status, progress, partial, result and error (JSON-encoded where needed)."""
+        columns = []
+        params = []
+        for column in ('status', 'error'):
+            if column in values:
+                columns.append(f"{column} = ?")
+                params.append(values[column])
+        for column in ('progress', 'partial', 'result'):
+            if column in values:
+                columns.append(f"{column} = ?")
+                params.append(json.dumps(values[column]))
+        columns.append("updated_at = ?")
+        params += [time.time(), job_id]
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(columns)} WHERE id = ?", params)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, session_id, status, progress, partial, result, error, created_at, updated_at"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, session_id, status, progress, partial, result, error, created_at, updated_at = row
+        return {
+            'id': job_id,
+            'kind': kind,
+            'session_id': session_id,
+            'status': status,
+            'progress': json.loads(progress) if progress else None,
+            'partial': json.loads(partial) if partial else None,
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'created_at': created_at,
+            'updated_at': updated_at,
+        }
+
+    def heartbeat(self, worker_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (id, heartbeat_at) VALUES (?, ?)", (worker_id, time.time()))
+
+    def fail_orphaned(self, max_silence: float) -> int:
+        """
+        Fails unfinished jobs whose worker has not sent a heartbeat for
+        `max_silence` seconds (or that have no owner), and forgets those workers.
+        Returns the number of jobs failed.
+        """
+        now = time.time()
+        cutoff = now - max_silence
+        with self._connect() as conn:
+            failed = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?) AND"
+                " (owner IS NULL OR owner NOT IN (SELECT id FROM workers WHERE heartbeat_at >= ?))",
+                (FAILED, 'Interrupted by a worker restart', now, QUEUED, RUNNING, cutoff),
+            ).rowcount
+            conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (cutoff,))
+        return failed
+
+    def purge(self, max_age: float) -> None:
+        """Drops finished jobs older than `max_age` seconds."""
+        cutoff = time.time() - max_age
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATUSES)}) AND updated_at < ?",
+                (*FINISHED_STATUSES, cutoff),
+            )
+
+
+class JobHandle:
+    """Passed to a running job so it can report progress and partial results."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.id = job_id
+
+    def report(self, progress: dict = None, partial=None) -> None:
+        values = {}
+        if progress is not None:
+            values['progress'] = progress
+        if partial is not None:
+            values['partial'] = partial
+        self.store.update(self.id, **values)
+
+
+class JobQueue:
+    """
+    Runs jobs on a bounded worker pool, recording their state in a JobStore.
+
+    A job function is called as fn(handle, *args) and its return value (which
+    must be JSON serialisable) becomes the job result.
+
+
+    While it is alive the queue beats every `heartbeat_interval` seconds and,
+    on each beat, fails the jobs of workers silent for `stale_after` seconds
+    (e.g. a process that was restarted mid-job).
+    """
+
+    def __init__(self, store: JobStore, workers: int = 4, heartbeat_interval: float = 5, stale_after: float = 30):
+        self.store = store
+        self.worker_id = uuid4().hex
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.store.heartbeat(self.worker_id)
+        self.store.fail_orphaned(stale_after)
+        threading.Thread(target=self._beat, name='job-heartbeat', daemon=True).start()
+
+    def _beat(self) -> None:
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.store.heartbeat(self.worker_id)
+                self.store.fail_orphaned(self.stale_after)
+            except sqlite3.Error as e:
+                if os.getenv('DEBUG_LLM') == '1':
+                    print(f"Job heartbeat failed: {e}")
+
+    def submit(self, kind: str, fn: Callable, *args, session_id: Optional[str] = None) -> str:
+        job_id = self.store.create(kind, session_id, owner=self.worker_id)
+        self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args) -> None:
+        self.store.update(job_id, status=RUNNING)
+        try:
+            result = fn(JobHandle(self.store, job_id), *args)
+        except Exception as e:
+            if os.getenv('DEBUG_LLM') == '1':
+                traceback.print_exc()
+            self.store.update(job_id, status=FAILED, error=str(e) or e.__class__.__name__)
+            return
+        self.store.update(job_id, status=SUCCEEDED, result=result)
+
+
+def create_job_queue() -> JobQueue:
+    """Builds the job queue from JOB_STORE_PATH, JOB_WORKERS, JOB_HEARTBEAT_SECONDS and JOB_STALE_SECONDS."""
+    store = JobStore(os.getenv('JOB_STORE_PATH', os.path.join('.cache', 'jobs.sqlite')))
+    return JobQueue(
+        store,
+        workers=int(os.getenv('JOB_WORKERS', '4')),
+        heartbeat_interval=float(os.getenv('JOB_HEARTBEAT_SECONDS', '5')),
+        # Unfinished jobs whose worker has been silent this long died with it
+        stale_after=float(os.getenv('JOB_STALE_SECONDS', '30')),
+    )
@@ -1,56 +1,632 @@
 import os
+import asyncio
 import base64
-from openai import OpenAI
-from typing import List, Optional
+import contextlib
+import contextvars
+import hashlib
+import io
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+from typing import Any, Dict, Iterator, List, Optional, Union
+from disk_cache import DiskCache
+from image_store import ImageStore
+from metrics import (
+    CACHE_REQUESTS,
+    JSON_PARSES,
+    LLM_CONCURRENCY_LIMIT,
+    LLM_ERRORS,
+    LLM_MAX_TOKENS,
+    LLM_REQUEST_SECONDS,
+    LLM_RETRIES,
+    LLM_TRUNCATIONS,
+    current_node,
+    record_usage,
+)
+from rate_limiter import RateLimiter, backoff_delay, parse_retry_after
+from tolerant_json import parse_json_lenient
 
 
-def _encode_image_to_base64(image_path: str) -> str:
-    """Encodes a local image file into a base64 data URI."""
+# LLM_BASE_URL points every client at another OpenAI-compatible backend, e.g. the local
+# stand-in in standin_server.py for offline performance runs
+OPENROUTER_BASE_URL = os.getenv('LLM_BASE_URL', "https://openrouter.ai/api/v1")
+TEXT_MODEL = "x-ai/grok-4-fast"
+IMAGE_MODEL = "google/gemini-2.5-flash-image"
+
+# Keep-alive pool size per model. Image generation is slower and is fanned out
+# per storyboard frame, so it gets its own pool rather than sharing with text.
+DEFAULT_POOL_SIZE = 8
+POOL_SIZES = {
+    TEXT_MODEL: 8,
+    IMAGE_MODEL: 6,
+}
+
+# Process-wide client registry: one OpenAI client (and HTTP connection pool) per model
+_CLIENTS: Dict[str, OpenAI] = {}
+_CLIENTS_LOCK = threading.Lock()
+# Async clients are bound to the event loop that created their connection pool
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+# Event loop behind run_sync (see _background_loop)
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+# Models that rejected a json_schema response_format; chat_json stops sending it to them
+_NO_STRUCTURED_OUTPUT = set()
+
+# Shared per-model rate limiters (see get_rate_limiter)
+_RATE_LIMITERS: Dict[str, RateLimiter] = {}
+
+# Recent completion sizes in tokens (continuations included) per node, for max_tokens_for
+_OUTPUT_SIZES: Dict[str, deque] = {}
+_OUTPUT_SIZES_LOCK = threading.Lock()
+
+# Opt-in response cache for text completions (LLM_CACHE=1)
+_COMPLETION_CACHE: Optional[DiskCache] = None
+# Content-addressed store for generated images (disable with IMAGE_CACHE=0)
+_IMAGE_STORE: Optional[ImageStore] = None
+_bypass_cache: contextvars.ContextVar[bool] = contextvars.ContextVar('bypass_completion_cache', default=False)
+
+
+class LLMError(Exception):
+    """An OpenRouter request failed. `retryable` errors were retried before being raised."""
+
+    def __init__(self, message: str, model: str = None, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.model = model
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class LLMRateLimitError(LLMError):
+    """The provider throttled the request (HTTP 429)."""
+
+
+class LLMTimeoutError(LLMError):
+    """The request timed out or the connection failed."""
+
+
+class LLMServerError(LLMError):
+    """The provider returned a 5xx error."""
+
+
+class LLMResponseError(LLMError):
+    """The provider answered, but without usable content."""
+
+
+def _classify_error(e: Exception, model: str) -> LLMError:
+    """Maps an OpenAI SDK exception onto the LLMError hierarchy."""
+    if isinstance(e, LLMError):
+        return e
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, httpx.TimeoutException)):
+        return LLMTimeoutError(f"{model}: {e}", model=model, retryable=True)
+    if isinstance(e, openai.APIStatusError):
+        status = e.status_code
+        retry_after = parse_retry_after(getattr(e.response, 'headers', None))
+        if status == 429:
+            return LLMRateLimitError(f"{model} rate limited: {e}", model=model, status=status, retryable=True,
+                                     retry_after=retry_after)
+        if status >= 500 or status == 408:
+            return LLMServerError(f"{model} server error {status}: {e}", model=model, status=status, retryable=True,
+                                  retry_after=retry_after)
+        return LLMError(f"{model} request rejected ({status}): {e}", model=model, status=status)
+    return LLMError(f"{model}: {e}", model=model)
+
+
+def _model_setting(name: str, model: str, default: str) -> str:
+    # <NAME>_<MODEL> overrides <NAME>, e.g. LLM_RPM_X_AI_GROK_4_FAST before LLM_RPM
+    env_key = f"{name}_" + "".join(c if c.isalnum() else "_" for c in model).upper()
+    return os.getenv(env_key) or os.getenv(name) or default
+
+
+def get_rate_limiter(model: str = TEXT_MODEL) -> RateLimiter:
+    """
+    Returns the process-wide rate limiter for a model.
+
+    LLM_RPM and LLM_TPM set requests and tokens per minute (0, the default,
+    disables that limit). The number of requests in flight starts at the model's
+    pool size and adapts between LLM_MIN_CONCURRENCY and LLM_MAX_CONCURRENCY,
+    shrinking when OpenRouter throttles. Each setting can be overridden per model.
+    """
+    limiter = _RATE_LIMITERS.get(model)
+    if limiter is not None:
+        return limiter
+    with _CLIENTS_LOCK:
+        limiter = _RATE_LIMITERS.get(model)
+        if limiter is None:
+            limiter = RateLimiter(
+                rpm=float(_model_setting('LLM_RPM', model, '0')),
+                tpm=float(_model_setting('LLM_TPM', model, '0')),
+                concurrency=_pool_size_for(model),
+                min_concurrency=int(_model_setting('LLM_MIN_CONCURRENCY', model, '1')),
+                max_concurrency=int(_model_setting('LLM_MAX_CONCURRENCY', model, '32')),
+            )
+            _RATE_LIMITERS[model] = limiter
+    return limiter
+
+
+def _retry_settings():
+    return (int(os.getenv('LLM_MAX_RETRIES', '4')),
+            float(os.getenv('LLM_BACKOFF_BASE', '1')),
+            float(os.getenv('LLM_BACKOFF_MAX', '30')))
+
+
+def _estimate_tokens(messages: list, max_tokens: int) -> int:
+    # Roughly four characters per token, plus the completion budget
+    return len(json.dumps(messages)) // 4 + max_tokens
+
+
+def _usage_tokens(usage) -> int:
+    if usage is None:
+        return 0
+    return getattr(usage, 'total_tokens', 0) or 0
+
+
+def _handle_failure(e: Exception, model: str, node: str, attempt: int, max_retries: int, base: float,
+                    cap: float) -> float:
+    """Records a failed attempt and returns the delay before the next one, or raises the typed error."""
+    error = _classify_error(e, model)
+    LLM_ERRORS.inc(model=model, node=node, error=type(error).__name__)
+    limiter = get_rate_limiter(model)
+    if isinstance(error, LLMRateLimitError):
+        limiter.on_throttle()
+        LLM_CONCURRENCY_LIMIT.set(int(limiter.concurrency.limit), model=model)
+    if not error.retryable or attempt >= max_retries:
+        if error is e:
+            raise error
+        raise error from e
+    LLM_RETRIES.inc(model=model, reason=type(error).__name__)
+    delay = backoff_delay(attempt, base, cap, error.retry_after)
+    if os.getenv('DEBUG_LLM') == '1':
+        print(f"{model} request failed ({error}); retrying in {delay:.1f}s")
+    return delay
+
+
+def _on_success(model: str, estimated: int, usage) -> None:
+    limiter = get_rate_limiter(model)
+    limiter.on_success()
+    limiter.record_tokens(estimated, _usage_tokens(usage))
+    LLM_CONCURRENCY_LIMIT.set(int(limiter.concurrency.limit), model=model)
+
+
+def _budget_settings():
+    return (int(os.getenv('LLM_MAX_TOKENS', '1024')),
+            int(os.getenv('LLM_MAX_TOKENS_CAP', '4096')),
+            int(os.getenv('LLM_MAX_CONTINUATIONS', '3')))
+
+
+def max_tokens_for(node: str) -> int:
+    """
+    Completion budget (max_tokens) for requests made by `node`.
+
+    LLM_MAX_TOKENS_<NODE> pins it. Otherwise it is LLM_MAX_TOKENS until the
+    node has produced a few outputs, then 1.25x the largest of its recent
+    outputs rounded up to 256, but never below LLM_MAX_TOKENS and never above
+    LLM_MAX_TOKENS_CAP. Outputs that still hit the budget are completed with
+    continuation requests.
+    """
+    pinned = os.getenv(f"LLM_MAX_TOKENS_{node.upper()}")
+    if pinned:
+        return int(pinned)
+    default, cap, _ = _budget_settings()
+    with _OUTPUT_SIZES_LOCK:
+        sizes = list(_OUTPUT_SIZES.get(node, ()))
+    if len(sizes) < 3:
+        return default
+    budget = -(-int(max(sizes) * 1.25) // 256) * 256
+    # Unused max_tokens costs nothing, so the budget only ever grows past the default
+    return max(default, min(cap, budget))
+
+
+def _record_output_size(node: str, completion_tokens: int) -> None:
+    if not completion_tokens:
+        return
+    with _OUTPUT_SIZES_LOCK:
+        _OUTPUT_SIZES.setdefault(node, deque(maxlen=20)).append(completion_tokens)
+    LLM_MAX_TOKENS.set(max_tokens_for(node), node=node)
+
+
+def _completion_tokens(usage, text: str) -> int:
+    tokens = getattr(usage, 'completion_tokens', 0) if usage is not None else 0
+    # Fall back to roughly four characters per token when the provider sent no usage
+    return tokens or len(text) // 4
+
+
+_CONTINUE_PROMPT = ("Your previous reply was cut off by the length limit. Continue exactly where it stopped, "
+                    "without repeating anything and without any commentary.")
+
+
+def _continuation_messages(messages: list, partial: str) -> list:
+    """The original conversation followed by the truncated reply and a request to carry on."""
+    return messages + [{"role": "assistant", "content": partial}, {"role": "user", "content": _CONTINUE_PROMPT}]
+
+
+def _continuation_params(params: dict) -> dict:
+    # A continuation is a fragment, so it cannot satisfy a response_format on its own
+    return {k: v for k, v in params.items() if k != 'response_format'}
+
+
+def _join_continuation(text: str, more: str) -> str:
+    # Models sometimes restart a few words back; drop the overlap when it is long enough to be deliberate
+    for size in range(min(len(text), len(more), 200), 15, -1):
+        if text.endswith(more[:size]):
+            return text + more[size:]
+    return text + more
+
+
+def _finish_reason(completion) -> Optional[str]:
+    try:
+        return completion.choices[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return None
 
+
+def _on_truncated(node: str, continuation: int, max_continuations: int) -> bool:
+    """Records a completion cut off at max_tokens; returns whether to request a continuation."""
+    more = continuation < max_continuations
+    LLM_TRUNCATIONS.inc(model=TEXT_MODEL, node=node, action='continued' if more else 'gave_up')
+    if os.getenv('DEBUG_LLM') == '1':
+        print(f"{TEXT_MODEL} output for {node} hit max_tokens; "
+              + ("requesting a continuation" if more else "giving up on continuations"))
+    return more
+
+
+def _complete_text(client: OpenAI, messages: list, node: str, **params) -> str:
+    """Sends a text completion, continuing it while the model stops at max_tokens."""
+    max_tokens = max_tokens_for(node)
+    _, _, max_continuations = _budget_settings()
+    text = ''
+    tokens = 0
+    for continuation in range(max_continuations + 1):
+        completion = _create_with_retries(
+            client, TEXT_MODEL, node,
+            messages=_continuation_messages(messages, text) if continuation else messages,
+            max_tokens=max_tokens,
+            **(_continuation_params(params) if continuation else params),
+        )
+        record_usage(TEXT_MODEL, completion.usage)
+        part = _completion_text(completion)
+        tokens += _completion_tokens(completion.usage, part)
+        text = _join_continuation(text, part)
+        if _finish_reason(completion) != 'length' or not _on_truncated(node, continuation, max_continuations):
+            break
+    _record_output_size(node, tokens)
+    return text
+
+
+async def _acomplete_text(client: AsyncOpenAI, messages: list, node: str, **params) -> str:
+    """Asyncio counterpart of _complete_text."""
+    max_tokens = max_tokens_for(node)
+    _, _, max_continuations = _budget_settings()
+    text = ''
+    tokens = 0
+    for continuation in range(max_continuations + 1):
+        completion = await _acreate_with_retries(
+            client, TEXT_MODEL, node,
+            messages=_continuation_messages(messages, text) if continuation else messages,
+            max_tokens=max_tokens,
+            **(_continuation_params(params) if continuation else params),
+        )
+        record_usage(TEXT_MODEL, completion.usage)
+        part = _completion_text(completion)
+        tokens += _completion_tokens(completion.usage, part)
+        text = _join_continuation(text, part)
+        if _finish_reason(completion) != 'length' or not _on_truncated(node, continuation, max_continuations):
+            break
+    _record_output_size(node, tokens)
+    return text
+
+
+def _create_with_retries(client: OpenAI, model: str, node: str, deadline: Optional[float] = None, **params):
+    """
+    Sends a chat completion request through the model's rate limiter, retrying
+    throttled and transient failures with jittered exponential backoff.
+
+    With a `deadline` (a time.monotonic() value) each attempt's timeout is
+    the time left, and no retry is started that could not finish before it.
+
+    Raises:
+        LLMError: the request failed for good (typed by cause).
+    """
+    limiter = get_rate_limiter(model)
+    estimated = _estimate_tokens(params.get('messages', []), params.get('max_tokens') or 0)
+    max_retries, base, cap = _retry_settings()
+    attempt = 0
+    while True:
+        try:
+            attempt_client = client
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMTimeoutError(f"{model} request deadline passed", model=model)
+                attempt_client = client.with_options(timeout=remaining)
+            with limiter.slot(estimated), LLM_REQUEST_SECONDS.time(model=model, node=node):
+                completion = attempt_client.chat.completions.create(model=model, **params)
+        except Exception as e:
+            delay = _handle_failure(e, model, node, attempt, max_retries, base, cap)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise LLMTimeoutError(f"{model} request deadline passed after {attempt + 1} attempts",
+                                      model=model) from e
+            attempt += 1
+            time.sleep(delay)
+            continue
+        _on_success(model, estimated, getattr(completion, 'usage', None))
+        return completion
+
+
+async def _acreate_with_retries(client: AsyncOpenAI, model: str, node: str, **params):
+    """Asyncio counterpart of _create_with_retries."""
+    limiter = get_rate_limiter(model)
+    estimated = _estimate_tokens(params.get('messages', []), params.get('max_tokens') or 0)
+    max_retries, base, cap = _retry_settings()
+    attempt = 0
+    while True:
+        try:
+            async with limiter.aslot(estimated):
+                with LLM_REQUEST_SECONDS.time(model=model, node=node):
+                    completion = await client.chat.completions.create(model=model, **params)
+        except Exception as e:
+            delay = _handle_failure(e, model, node, attempt, max_retries, base, cap)
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        _on_success(model, estimated, getattr(completion, 'usage', None))
+        return completion
+
+
+def _get_api_key() -> str:
+    api_key = os.getenv('OPENROUTER_API_KEY') or "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"
+    if not api_key:
+        raise EnvironmentError("OPENROUTER_API_KEY environment variable not set.")
+    return api_key
+
+
+def _pool_size_for(model: str) -> int:
+    """Pool size for a model; OPENROUTER_POOL_SIZE_<MODEL> overrides, e.g. OPENROUTER_POOL_SIZE_X_AI_GROK_4_FAST."""
+    env_key = "OPENROUTER_POOL_SIZE_" + "".join(c if c.isalnum() else "_" for c in model).upper()
+    value = os.getenv(env_key) or os.getenv('OPENROUTER_POOL_SIZE')
+    try:
+        return max(1, int(value)) if value else POOL_SIZES.get(model, DEFAULT_POOL_SIZE)
+    except ValueError:
+        return POOL_SIZES.get(model, DEFAULT_POOL_SIZE)
+
+
+def _http_timeout() -> httpx.Timeout:
+    connect = float(os.getenv('OPENROUTER_CONNECT_TIMEOUT', '5'))
+    read = float(os.getenv('OPENROUTER_READ_TIMEOUT', '120'))
+    return httpx.Timeout(read, connect=connect)
+
+
+def get_client(model: str = TEXT_MODEL) -> OpenAI:
+    """
+    Returns the shared OpenRouter client for a model, creating it on first use.
+
+    Each client owns a keep-alive HTTP connection pool, so consecutive calls
+    reuse TLS connections instead of paying a new handshake every time.
+    """
+    client = _CLIENTS.get(model)
+    if client is not None:
+        return client
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(model)
+        if client is None:
+            pool_size = _pool_size_for(model)
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=_http_timeout(),
+            )
+            client = OpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=_get_api_key(),
+                http_client=http_client,
+                # Retries go through the shared rate limiter instead (see _create_with_retries)
+                max_retries=0,
+            )
+            _CLIENTS[model] = client
+    return client
+
+
+def get_async_client(model: str = TEXT_MODEL) -> AsyncOpenAI:
+    """Returns the shared async OpenRouter client for a model on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _CLIENTS_LOCK:
+        clients = _ASYNC_CLIENTS.setdefault(loop, {})
+        client = clients.get(model)
+        if client is None:
+            pool_size = _pool_size_for(model)
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=_http_timeout(),
+            )
+            client = AsyncOpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=_get_api_key(),
+                http_client=http_client,
+                # Retries go through the shared rate limiter instead (see _create_with_retries)
+                max_retries=0,
+            )
+            clients[model] = client
+    return client
+
+
+def warm_up_clients(models: Optional[List[str]] = None) -> None:
+    """
+    Creates the shared clients and opens a connection for each of them.
+
+    Intended to be called once at app start so the first real request does not
+    pay for connection setup. Failures are ignored; the call is an optimisation.
+    """
+    for model in models or [TEXT_MODEL, IMAGE_MODEL]:
+        try:
+            get_client(model).models.list()
+        except Exception as e:
+            if os.getenv('DEBUG_LLM') == '1':
+                print(f"Warm-up for {model} failed: {e}")
+
+
+# Encoded data URIs keyed by (path, mtime, size, max edge), most recently used last
+_ENCODED_IMAGES: "OrderedDict[tuple, str]" = OrderedDict()
+_ENCODED_IMAGES_BYTES = 0
+_ENCODED_IMAGES_LOCK = threading.Lock()
+# Multiple of 3 so every chunk encodes to base64 without padding
+_BASE64_CHUNK = 3 * 256 * 1024
+
+
+def _image_mime_type(image_path: str) -> str:
     # Infer MIME type from the file extension
     extension = image_path.split('.')[-1].lower()
-    mime_type = "image/jpeg"  # Default
     if extension == "png":
-        mime_type = "image/png"
-    elif extension == "webp":
-        mime_type = "image/webp"
+        return "image/png"
+    if extension == "webp":
+        return "image/webp"
+    return "image/jpeg"  # Default
+
+
+def _base64_chunks(stream) -> Iterator[str]:
+    # Encodes a block at a time, so the raw bytes are never held in full next to their encoding
+    for block in iter(lambda: stream.read(_BASE64_CHUNK), b''):
+        yield base64.b64encode(block).decode('ascii')
+
+
+def _downscaled_image(image_path: str, max_edge: int) -> Optional[tuple]:
+    """(mime type, encoded bytes) of the image shrunk to `max_edge`, or None if it is small enough or Pillow is missing."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(image_path) as image:
+        if max(image.size) <= max_edge:
+            return None
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        # Keep transparency (logos) as PNG; photos and frames go as JPEG
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image.save(buffer, 'PNG', optimize=True)
+            mime_type = "image/png"
+        else:
+            image.convert('RGB').save(buffer, 'JPEG', quality=85)
+            mime_type = "image/jpeg"
+    buffer.seek(0)
+    return mime_type, buffer
+
+
+def _encode_image_to_base64(image_path: str) -> str:
+    """
+    Encodes a local image file into a base64 data URI.
 
-    # Read the image in binary mode and encode it
+    Images larger than LLM_IMAGE_MAX_EDGE pixels (default 1568; 0 keeps the
+    original) on their longest side are downscaled first when Pillow is
+    installed. Results are cached in memory per path, mtime and size, up to
+    LLM_IMAGE_CACHE_MB (default 64), so resending the same frame or logo does
+    not read and encode it again.
+    """
+    global _ENCODED_IMAGES_BYTES
+    max_edge = int(os.getenv('LLM_IMAGE_MAX_EDGE', '1568'))
     try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-        return f"data:{mime_type};base64,{encoded_string}"
+        stat = os.stat(image_path)
+        key = (os.path.realpath(image_path), stat.st_mtime_ns, stat.st_size, max_edge)
+        with _ENCODED_IMAGES_LOCK:
+            cached = _ENCODED_IMAGES.get(key)
+            if cached is not None:
+                _ENCODED_IMAGES.move_to_end(key)
+                return cached
+
+        downscaled = None
+        if max_edge > 0:
+            try:
+                downscaled = _downscaled_image(image_path, max_edge)
+            except Exception as e:
+                # Formats Pillow cannot read are sent as they are
+                if os.getenv('DEBUG_LLM') == '1':
+                    print(f"Could not downscale {image_path}, sending the original: {e}")
+        # The prefix and every chunk go into one buffer, so the encoding is only copied out once
+        uri = io.StringIO()
+        if downscaled is not None:
+            mime_type, stream = downscaled
+            uri.write(f"data:{mime_type};base64,")
+            uri.writelines(_base64_chunks(stream))
+        else:
+            uri.write(f"data:{_image_mime_type(image_path)};base64,")
+            with open(image_path, "rb") as image_file:
+                uri.writelines(_base64_chunks(image_file))
+        data_uri = uri.getvalue()
     except IOError as e:
         print(f"Error reading image file {image_path}: {e}")
         raise
 
+    limit = int(os.getenv('LLM_IMAGE_CACHE_MB', '64')) * 1024 * 1024
+    if len(data_uri) <= limit:
+        with _ENCODED_IMAGES_LOCK:
+            if key not in _ENCODED_IMAGES:
+                _ENCODED_IMAGES[key] = data_uri
+                _ENCODED_IMAGES_BYTES += len(data_uri)
+            while _ENCODED_IMAGES_BYTES > limit:
+                _, evicted = _ENCODED_IMAGES.popitem(last=False)
+                _ENCODED_IMAGES_BYTES -= len(evicted)
+    return data_uri
 
-def chat_with_openrouter(prompt: str, extra_prompt=None, image_paths: Optional[List[str]] = None) -> str:
-    """
-    Sends a text prompt and optional images to x-ai/grok-4-fast via OpenRouter.
 
-    Args:
-        prompt: The text prompt to send to the model.
-        image_paths: A list of local file paths to the images.
+def get_completion_cache() -> Optional[DiskCache]:
+    """Returns the text completion cache, or None unless LLM_CACHE=1."""
+    global _COMPLETION_CACHE
+    if os.getenv('LLM_CACHE') != '1':
+        return None
+    if _COMPLETION_CACHE is None:
+        with _CLIENTS_LOCK:
+            if _COMPLETION_CACHE is None:
+                _COMPLETION_CACHE = DiskCache(
+                    os.getenv('LLM_CACHE_PATH', os.path.join('.cache', 'llm_completions.sqlite')),
+                    max_bytes=int(float(os.getenv('LLM_CACHE_MAX_MB', '200')) * 1024 * 1024),
+                    ttl=float(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600))),
+                )
+    return _COMPLETION_CACHE
 
-    Returns:
-        The text response from the model.
-    """
-    if extra_prompt:
-        prompt += " " + extra_prompt
 
-    # 1. Get API key from environment variables
-    api_key =  "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"
-    if not api_key:
-        raise EnvironmentError("OPENROUTER_API_KEY environment variable not set.")
+@contextlib.contextmanager
+def bypass_completion_cache():
+    """Within this block, completions skip the cache lookup (fresh results still refresh the cache)."""
+    token = _bypass_cache.set(True)
+    try:
+        yield
+    finally:
+        _bypass_cache.reset(token)
 
-    # 2. Initialize the client to point to OpenRouter
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-    )
 
-    # 3. Build the multimodal message content
+def completion_cache_key(model: str, messages: list, **params) -> str:
+    """Content hash of everything that determines a completion: backend, model, messages (including images) and parameters."""
+    # Completions from a stand-in backend (LLM_BASE_URL) must never be served as real ones
+    payload = json.dumps({'base_url': OPENROUTER_BASE_URL, 'model': model, 'messages': messages, 'params': params},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cached_completion(key: str, bypass_cache: bool) -> Optional[str]:
+    cache = get_completion_cache()
+    if cache is None or bypass_cache or _bypass_cache.get():
+        return None
+    content = cache.get(key)
+    CACHE_REQUESTS.inc(cache='completion', result='hit' if content is not None else 'miss')
+    return content
+
+
+def _store_completion(key: str, content: Optional[str]) -> None:
+    cache = get_completion_cache()
+    if cache is not None and content:
+        cache.set(key, content)
+
+
+def _build_messages(prompt: str, extra_prompt=None, image_paths: Optional[List[str]] = None) -> list:
+    """Builds the single-turn multimodal messages list shared by the sync and async chat calls."""
+    if extra_prompt:
+        prompt += " " + extra_prompt
+
+    # Build the multimodal message content
     user_content = []
 
     # Add the text prompt first
@@ -69,55 +645,335 @@ def chat_with_openrouter(prompt: str, extra_prompt=None, image_paths: Optional[L
             except Exception as e:
                 print(f"Warning: Could not encode image {path}. Skipping. Error: {e}")
 
-    # 4. Create the final messages list
-    messages = [
+    # Create the final messages list
+    return [
         {
             "role": "user",
             "content": user_content,
         }
     ]
 
+
+def chat_with_openrouter(prompt: str, extra_prompt=None, image_paths: Optional[List[str]] = None,
+                         bypass_cache: bool = False, stream: bool = False,
+                         response_format: Optional[dict] = None) -> Union[str, Iterator[str]]:
+    """
+    Sends a text prompt and optional images to x-ai/grok-4-fast via OpenRouter.
+
+    Args:
+        prompt: The text prompt to send to the model.
+        image_paths: A list of local file paths to the images.
+        bypass_cache: Skip the completion cache lookup (e.g. for "regenerate" actions).
+        stream: Return an iterator of text deltas instead of the full response.
+        response_format: Optional OpenAI-style response_format, e.g. a JSON schema (see chat_json).
+
+    Returns:
+        The text response from the model, or an iterator over its chunks when stream=True.
+
+    Raises:
+        LLMError: the request failed after retries (when streaming, raised while iterating).
+    """
+    # 1-2. Reuse the pooled client for this model
+    client = get_client(TEXT_MODEL)
+
+    # 3-4. Build the multimodal messages list
+    messages = _build_messages(prompt, extra_prompt, image_paths)
+
+    # max_tokens is left out of the key: truncated replies are continued, so the budget does not change the result
+    extra_params = {'response_format': response_format} if response_format else {}
+    cache_key = completion_cache_key(TEXT_MODEL, messages, **extra_params)
+    cached = _cached_completion(cache_key, bypass_cache)
+    if cached is not None:
+        return iter([cached]) if stream else cached
+
+    if stream:
+        # Capture the node label now; the generator body runs later, outside the caller's context
+        return _stream_completion(client, messages, cache_key, current_node.get(), extra_params)
+
     if os.getenv('DEBUG_LLM') == '1':
         print("Sending request to Grok-4-fast...")
+    # 5. Send the request (rate limited, with retries, continued if it hits max_tokens)
+    content = _complete_text(client, messages, current_node.get(), **extra_params)
+
+    # 6. Return the text content of the response
+    _store_completion(cache_key, content)
+    return content
+
+
+def _completion_text(completion) -> str:
     try:
-        # 5. Send the request
-        completion = client.chat.completions.create(
-            model="x-ai/grok-4-fast",
-            messages=messages,
-            max_tokens=1024,  # Set a reasonable limit
-        )
+        content = completion.choices[0].message.content
+    except (AttributeError, IndexError, TypeError):
+        content = None
+    if content is None:
+        raise LLMResponseError(f"{TEXT_MODEL} returned no content", model=TEXT_MODEL)
+    return content
 
-        # 6. Return the text content of the response
-        return completion.choices[0].message.content
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return "Error: Could not get a response."
+def _stream_completion(client: OpenAI, messages: list, cache_key: str, node: str,
+                       extra_params: Optional[dict] = None) -> Iterator[str]:
+    """
+    Yields text deltas as they arrive; the assembled response is cached once the stream completes.
 
-def generate_image_with_style(prompt: str, style: str = "TSB Advert") -> Optional[bytes]:
+    A stream that stops at max_tokens is continued with a follow-up request,
+    whose deltas are yielded as part of the same stream.
     """
-    Generates an image based on a prompt and style using google/gemini-2.5-flash-image.
+    if os.getenv('DEBUG_LLM') == '1':
+        print("Sending streaming request to Grok-4-fast...")
+    token = current_node.set(node)
+    text = ''
+    limiter = get_rate_limiter(TEXT_MODEL)
+    max_tokens = max_tokens_for(node)
+    _, _, max_continuations = _budget_settings()
+    max_retries, base, cap = _retry_settings()
+    tokens = 0
+    start = time.perf_counter()
+    try:
+        for continuation in range(max_continuations + 1):
+            request_messages = _continuation_messages(messages, text) if continuation else messages
+            params = _continuation_params(extra_params or {}) if continuation else (extra_params or {})
+            estimated = _estimate_tokens(request_messages, max_tokens)
+            attempt = 0
+            while True:
+                usage = None
+                finish_reason = None
+                round_text = ''
+                # A continuation's head is held back until any overlap with the text so far is known
+                skip = None if continuation else 0
+                try:
+                    # The slot is held until the stream is fully read (or the consumer stops)
+                    with limiter.slot(estimated):
+                        for chunk in client.chat.completions.create(
+                            model=TEXT_MODEL,
+                            messages=request_messages,
+                            max_tokens=max_tokens,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                            **params,
+                        ):
+                            # The final chunk carries usage and no choices
+                            if getattr(chunk, 'usage', None):
+                                usage = chunk.usage
+                                record_usage(TEXT_MODEL, usage)
+                            if not chunk.choices:
+                                continue
+                            finish_reason = chunk.choices[0].finish_reason or finish_reason
+                            delta = chunk.choices[0].delta.content
+                            if not delta:
+                                continue
+                            round_text += delta
+                            if skip is None:
+                                if len(round_text) < 200:
+                                    continue
+                                skip = len(text) + len(round_text) - len(_join_continuation(text, round_text))
+                                delta = round_text[skip:]
+                            if delta:
+                                yield delta
+                    if finish_reason is None:
+                        # A complete stream always ends with a finish_reason; without one it was cut off
+                        raise LLMServerError(f"{TEXT_MODEL} stream ended without a finish_reason", model=TEXT_MODEL,
+                                             retryable=True)
+                except Exception as e:
+                    if skip is not None and round_text:
+                        # Part of the answer was already sent on; a retry would repeat it
+                        error = _classify_error(e, TEXT_MODEL)
+                        LLM_ERRORS.inc(model=TEXT_MODEL, node=node, error=type(error).__name__)
+                        raise error from e
+                    delay = _handle_failure(e, TEXT_MODEL, node, attempt, max_retries, base, cap)
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                _on_success(TEXT_MODEL, estimated, usage)
+                break
+            if skip is None:
+                skip = len(text) + len(round_text) - len(_join_continuation(text, round_text))
+                if round_text[skip:]:
+                    yield round_text[skip:]
+            text += round_text[skip:]
+            tokens += _completion_tokens(usage, round_text)
+            if finish_reason != 'length' or not _on_truncated(node, continuation, max_continuations):
+                break
+    finally:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=TEXT_MODEL, node=node)
+        current_node.reset(token)
+    _record_output_size(node, tokens)
+    _store_completion(cache_key, text)
+
+
+async def achat_with_openrouter(prompt: str, extra_prompt=None, image_paths: Optional[List[str]] = None,
+                               bypass_cache: bool = False, response_format: Optional[dict] = None) -> str:
+    """
+    Asyncio counterpart of chat_with_openrouter.
 
     Args:
-        prompt: The text prompt to guide the image generation.
-        style: The style to apply to the image generation. Defaults to "TSB Advert".
+        prompt: The text prompt to send to the model.
+        extra_prompt: Optional text appended to the prompt.
+        image_paths: A list of local file paths to the images.
+        bypass_cache: Skip the completion cache lookup.
+        response_format: Optional OpenAI-style response_format.
 
     Returns:
-        The generated image as bytes, or None if the generation fails.
+        The text response from the model.
+
+    Raises:
+        LLMError: the request failed after retries.
     """
-    # Combine the prompt and style
-    full_prompt = f"{prompt} in the style of {style}"
+    client = get_async_client(TEXT_MODEL)
+    messages = _build_messages(prompt, extra_prompt, image_paths)
 
-    # 1. Get API key from environment variables
-    api_key = "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"
-    if not api_key:
-        raise EnvironmentError("OPENROUTER_API_KEY environment variable not set.")
+    extra_params = {'response_format': response_format} if response_format else {}
+    cache_key = completion_cache_key(TEXT_MODEL, messages, **extra_params)
+    cached = _cached_completion(cache_key, bypass_cache)
+    if cached is not None:
+        return cached
 
-    # 2. Initialize the client to point to OpenRouter
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-    )
+    if os.getenv('DEBUG_LLM') == '1':
+        print("Sending async request to Grok-4-fast...")
+    content = await _acomplete_text(client, messages, current_node.get(), **extra_params)
+    _store_completion(cache_key, content)
+    return content
+
+
+def json_schema_format(name: str, schema: dict) -> dict:
+    """response_format asking for output that matches `schema` (strict structured output)."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _structured_output_enabled() -> bool:
+    return os.getenv('LLM_STRUCTURED_OUTPUT', '1') == '1' and TEXT_MODEL not in _NO_STRUCTURED_OUTPUT
+
+
+def _rejects_response_format(error: LLMError, response_format: Optional[dict]) -> bool:
+    """True (and remembered for the model) when a 400 says the model does not support response_format."""
+    if response_format is None or error.status != 400:
+        return False
+    # Other 400s (context length, a bad image, ...) are real errors and must not switch structured output off
+    details = f"{error} {getattr(error.__cause__, 'body', '') or ''}".lower()
+    if 'response_format' not in details and 'json_schema' not in details:
+        return False
+    _NO_STRUCTURED_OUTPUT.add(TEXT_MODEL)
+    if os.getenv('DEBUG_LLM') == '1':
+        print(f"{TEXT_MODEL} rejected response_format; falling back to prompt-only JSON ({error})")
+    return True
+
+
+def _stream_json(prompt: str, extra_prompt, bypass_cache: bool, response_format: Optional[dict]) -> Iterator[str]:
+    # Request errors surface on the first next(), so the fallback has to live inside the generator
+    try:
+        yield from chat_with_openrouter(prompt, extra_prompt, bypass_cache=bypass_cache, stream=True,
+                                        response_format=response_format)
+        return
+    except LLMError as e:
+        if not _rejects_response_format(e, response_format):
+            raise
+    yield from chat_with_openrouter(prompt, extra_prompt, bypass_cache=bypass_cache, stream=True)
+
+
+# Python type of a schema's top-level JSON type, so a bracket in a preamble is not parsed as the reply
+_SCHEMA_TYPES = {'object': dict, 'array': list}
+
+
+def chat_json(prompt: str, schema: dict, name: str, extra_prompt=None, bypass_cache: bool = False,
+              stream: bool = False) -> Union[Any, Iterator[str]]:
+    """
+    Requests a JSON value matching `schema` and parses it leniently.
+
+    The schema is sent as a strict json_schema response_format (LLM_STRUCTURED_OUTPUT=0
+    turns that off; a model that rejects it is retried once without). Code fences,
+    surrounding text and truncation are tolerated by parse_json_lenient, so a
+    slightly malformed reply still yields whatever parts of it are valid.
+
+    Args:
+        prompt: The text prompt, which should also describe the expected JSON.
+        schema: JSON schema of the expected value.
+        name: Schema name sent to the provider.
+        extra_prompt: Optional text appended to the prompt.
+        bypass_cache: Skip the completion cache lookup.
+        stream: Return the raw text deltas (for IncrementalJSONParser) instead of the parsed value.
+
+    Returns:
+        The parsed value, or an iterator over the text deltas when stream=True.
+
+    Raises:
+        LLMError: the request failed after retries.
+        LLMResponseError: no JSON could be recovered from the reply.
+    """
+    response_format = json_schema_format(name, schema) if _structured_output_enabled() else None
+    if stream:
+        return _stream_json(prompt, extra_prompt, bypass_cache, response_format)
+    try:
+        reply = chat_with_openrouter(prompt, extra_prompt, bypass_cache=bypass_cache,
+                                     response_format=response_format)
+    except LLMError as e:
+        if not _rejects_response_format(e, response_format):
+            raise
+        reply = chat_with_openrouter(prompt, extra_prompt, bypass_cache=bypass_cache)
+    try:
+        value, complete = parse_json_lenient(reply, _SCHEMA_TYPES.get(schema.get('type')))
+    except ValueError as e:
+        JSON_PARSES.inc(node=current_node.get(), outcome='failed')
+        raise LLMResponseError(f"{TEXT_MODEL} returned no usable JSON for {name}: {e}", model=TEXT_MODEL) from e
+    JSON_PARSES.inc(node=current_node.get(), outcome='complete' if complete else 'repaired')
+    return value
+
+
+async def aclose_async_clients() -> None:
+    """Closes the async clients created on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _CLIENTS_LOCK:
+        clients = _ASYNC_CLIENTS.pop(loop, {})
+    for client in clients.values():
+        await client.close()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide event loop that run_sync drives coroutines on, started on first use."""
+    global _LOOP
+    with _CLIENTS_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name='llm-async', daemon=True).start()
+    return _LOOP
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine to completion from synchronous code and returns its result.
+
+    Coroutines run on one long-lived event loop in a background thread, so the
+    async clients (and their pooled connections) bound to it are reused across
+    calls. Works from plain threads (Flask request handlers, the LangGraph
+    runner) and from threads that already run an event loop of their own.
+    Context variables (e.g. the metrics node label) are carried over.
+    """
+    loop = _background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() cannot be called from a coroutine on its own loop; await it instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def get_image_store() -> Optional[ImageStore]:
+    """Returns the shared generated-image store, or None when IMAGE_CACHE=0."""
+    global _IMAGE_STORE
+    if os.getenv('IMAGE_CACHE', '1') != '1':
+        return None
+    if _IMAGE_STORE is None:
+        with _CLIENTS_LOCK:
+            if _IMAGE_STORE is None:
+                _IMAGE_STORE = ImageStore(
+                    os.getenv('IMAGE_CACHE_DIR', os.path.join('static', 'generated', 'image_cache')),
+                    max_bytes=int(float(os.getenv('IMAGE_CACHE_MAX_MB', '500')) * 1024 * 1024),
+                )
+    return _IMAGE_STORE
+
+
+def _request_image(full_prompt: str, timeout: Optional[float] = None) -> Optional[bytes]:
+    # 1-2. Reuse the pooled client for this model
+    client = get_client(IMAGE_MODEL)
 
     # 3. Build the request payload
     messages = [
@@ -130,11 +986,15 @@ def generate_image_with_style(prompt: str, style: str = "TSB Advert") -> Optiona
     if os.getenv('DEBUG_LLM') == '1':
         print("Sending image generation request to google/gemini-2.5-flash-image...")
     # 4. Send the request
-    completion = client.chat.completions.create(
-        model="google/gemini-2.5-flash-image",
+    node = current_node.get()
+    # The timeout covers every retry, not each attempt
+    completion = _create_with_retries(
+        client, IMAGE_MODEL, node,
+        deadline=time.monotonic() + timeout if timeout is not None else None,
         messages=messages,
         max_tokens=0,  # No text response expected
     )
+    record_usage(IMAGE_MODEL, getattr(completion, 'usage', None))
 
     # 5. Extract the image content from the response
     message = completion.choices[0].message
@@ -143,19 +1003,84 @@ def generate_image_with_style(prompt: str, style: str = "TSB Advert") -> Optiona
 
     # The 'message' object has a 'content' attribute which is a LIST
     # We want the first item in that list
-    content_part = message.content[0]
+    try:
+        content_part = message.content[0]
+    except (IndexError, TypeError) as e:
+        raise LLMResponseError(f"{IMAGE_MODEL} returned no image", model=IMAGE_MODEL) from e
 
     if os.getenv('DEBUG_LLM') == '1':
         print(content_part)
 
-
-
     # Now you can decode it
-    import base64
     return base64.b64decode(content_part)
 
 
+def generate_image_with_style(prompt: str, style: str = "TSB Advert", timeout: Optional[float] = None,
+                              use_cache: bool = True) -> Optional[bytes]:
+    """
+    Generates an image based on a prompt and style using google/gemini-2.5-flash-image.
+
+    Args:
+        prompt: The text prompt to guide the image generation.
+        style: The style to apply to the image generation. Defaults to "TSB Advert".
+        timeout: Optional overall timeout in seconds, retries included, overriding the client default.
+        use_cache: Serve and record the image through the content-addressed image store.
+
+    Returns:
+        The generated image as bytes.
+
+    Raises:
+        LLMError: the image request failed after retries.
+    """
+    # Combine the prompt and style
+    full_prompt = f"{prompt} in the style of {style}"
+
+    store = get_image_store() if use_cache else None
+    if store is not None:
+        key = ImageStore.key_for(OPENROUTER_BASE_URL, IMAGE_MODEL, full_prompt, style)
+        cached = store.get(key)
+        CACHE_REQUESTS.inc(cache='image', result='hit' if cached else 'miss')
+        if cached:
+            return cached
+
+    image = _request_image(full_prompt, timeout)
+    if store is not None and image:
+        store.put(key, image)
+    return image
+
+
+def save_image_with_style(prompt: str, style: str, dest_path: str, timeout: Optional[float] = None) -> bool:
+    """
+    Generates an image (see generate_image_with_style) and places it at dest_path.
+
+    When the image store is enabled the destination is hard-linked to the stored
+    file, so a previously rendered prompt/style pair costs no generation and no copy.
+
+    Returns:
+        True if an image was written to dest_path.
+
+    Raises:
+        LLMError: the image request failed after retries.
+    """
+    full_prompt = f"{prompt} in the style of {style}"
+    store = get_image_store()
+    if store is not None:
+        key = ImageStore.key_for(OPENROUTER_BASE_URL, IMAGE_MODEL, full_prompt, style)
+        linked = store.link(key, dest_path)
+        CACHE_REQUESTS.inc(cache='image', result='hit' if linked else 'miss')
+        if linked:
+            return True
 
+    image = _request_image(full_prompt, timeout)
+    if not image:
+        return False
+    if store is not None:
+        store.put(key, image)
+        if store.link(key, dest_path, record=False):
+            return True
+    with open(dest_path, 'wb') as f:
+        f.write(image)
+    return True
 
 
 # Example usage
@@ -1,13 +1,22 @@
+import argparse
+import asyncio
 import json
 import os
-from llm_library import chat_with_openrouter
+import time
+from brand_sources import BRAND_CACHE_TTL, fetch_brand_info, normalize_domain
+from llm_library import LLMError, achat_with_openrouter, chat_json, chat_with_openrouter, run_sync
+from memo import NodeMemo, create_node_memo, file_digest
+from metrics import JSON_PARSES, current_node, instrument_node, node_context
+from state_projection import project_state, projection_inputs
+from tolerant_json import IncrementalJSONParser, parse_json_lenient
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, Any, List
+from typing import TypedDict, Any, Callable, Iterator, List, Optional
 
 
 # 1. Define the state for the graph
 # This is required for StateGraph
 class GraphState(TypedDict):
+    brand_source: str  # Brand JSON file or website URL the research agent starts from
     company_info: str
     summary_plan_audience: str
     user_decision: str
@@ -24,34 +33,60 @@ class GraphState(TypedDict):
 # (All nodes from research_agent_node to creation_of_scripts_node remain the same)
 # ... (brand_strategist_node, user_feedback_yes_no_node, etc.)
 
+DEFAULT_BRAND_SOURCE = "anthopic.json"
+
+
+def is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://", "www."))
+
+
+@instrument_node('research_agent')
 def research_agent_node(state: GraphState):
-    with open("anthopic.json", "r") as f:
-        company_data = json.load(f)
+    source = state.get("brand_source") or DEFAULT_BRAND_SOURCE
+    if is_url(source):
+        company_data = fetch_brand_info(source, normalize_domain(source))
+    else:
+        with open(source, "r") as f:
+            company_data = json.load(f)
     return {"company_info": company_data}
 
 
-def brand_strategist_node(state: GraphState):
-    system_prompt = (f"""You are the Brand Strategist AI Agent. You are a master of understanding businesses, markets, and people. You instinctively see how a product fits into the bigger business picture and how brand storytelling can drive measurable growth. You can instantly adapt your tone and direction. You have deep, cross-industry knowledge and can quickly grasp what makes each business unique.
+def build_brand_strategist_prompt(state: GraphState) -> str:
+    company_context, _ = project_state('brand_strategist', state)
+    return (f"""You are the Brand Strategist AI Agent. You are a master of understanding businesses, markets, and people. You instinctively see how a product fits into the bigger business picture and how brand storytelling can drive measurable growth. You can instantly adapt your tone and direction. You have deep, cross-industry knowledge and can quickly grasp what makes each business unique.
 
-    Your goal is to help the business succeed. Every idea, plan, and observation should serve that purpose. You translate data and company information (received in structured JSON form) into clear strategic insight: what the company stands for, who it needs to reach, and why its message matters. You balance creativity with commercial logic. Here is the company information: {state}
+    Your goal is to help the business succeed. Every idea, plan, and observation should serve that purpose. You translate data and company information (received in structured JSON form) into clear strategic insight: what the company stands for, who it needs to reach, and why its message matters. You balance creativity with commercial logic. Here is the company information: {company_context}
 
     You must analyse the company information. Your entire response must contain exactly three short, numbered points. Do not add any other text.
 
     Brand Core: [A concise statement defining the brand's essence].
     Brand Positioning (Key Differentiator): [A concise statement defining the unique value].
     Brand Positioning (Target Audience): [A concise statement defining the primary customer]. """)
+
+
+@instrument_node('brand_strategist')
+def brand_strategist_node(state: GraphState):
+    system_prompt = build_brand_strategist_prompt(state)
     return {"summary_plan_audience": chat_with_openrouter(system_prompt)}
 
 
+def brand_strategist_stream(state: GraphState) -> Iterator[str]:
+    """Streaming variant of brand_strategist_node: yields the strategy text as it is generated."""
+    with node_context('brand_strategist'):
+        return chat_with_openrouter(build_brand_strategist_prompt(state), stream=True)
+
+
+@instrument_node('user_feedback_yes_no')
 def user_feedback_yes_no_node(state: GraphState):
     print("User says: Yes/No")
     return {"user_decision": "Yes"}
 
 
-def creative_director_node(state: GraphState):
-    system_prompt = (f"""You are the Creative Director AI Agent. You are an advertising mind with an instinct for storytelling. You understand audiences. You know how to capture attention. You make messages resonate.
+def build_creative_director_prompt(state: GraphState) -> str:
+    strategy_context, _ = project_state('creative_director', state)
+    return (f"""You are the Creative Director AI Agent. You are an advertising mind with an instinct for storytelling. You understand audiences. You know how to capture attention. You make messages resonate.
 
-    You work with the Brand Strategist. You turn brand insight into creative ideas. Your goal is to help the business grow and connect with people. Here is the brand strategy and brand information: {state}
+    You work with the Brand Strategist. You turn brand insight into creative ideas. Your goal is to help the business grow and connect with people. Here is the brand strategy and brand information: {strategy_context}
 
     Your task is to generate exactly four distinct creative ideas.
     You must format your entire output as follows.
@@ -74,20 +109,95 @@ def creative_director_node(state: GraphState):
     Location
     [Your location description here...]
     """)
+
+
+@instrument_node('creative_director')
+def creative_director_node(state: GraphState):
+    system_prompt = build_creative_director_prompt(state)
     return {"creative_director_node": chat_with_openrouter(system_prompt)}
 
 
+def creative_director_stream(state: GraphState) -> Iterator[str]:
+    """Streaming variant of creative_director_node: yields the '§'-separated concepts as they are generated."""
+    with node_context('creative_director'):
+        return chat_with_openrouter(build_creative_director_prompt(state), stream=True)
+
+
+@instrument_node('br_feedback')
 def br_feedback_node(state: GraphState):
     print("BR Feedback")
     return {"br_feedback_result": "BR feedback provided"}
 
 
+@instrument_node('user_feedback_loop')
 def user_feedback_loop_node(state: GraphState):
     print("User Feedback (Loop): Yes/No until user happy")
     return {"user_happy": True}
 
 
-def creation_of_scripts_node(state):
+SCENE_KEYS = ("scene_number", "timestamp_start", "timestamp_end", "setting",
+              "visual_description", "text_on_screen", "audio_cue")
+
+# Strict structured-output schemas (every key required, nothing extra)
+SCRIPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "script": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    key: {"type": "number" if key == "scene_number" else "string"} for key in SCENE_KEYS
+                },
+                "required": list(SCENE_KEYS),
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["script"],
+    "additionalProperties": False,
+}
+
+THEMES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "global_theme": {"type": "string"},
+        "global_figures": {"type": "string"},
+    },
+    "required": ["global_theme", "global_figures"],
+    "additionalProperties": False,
+}
+
+
+def _valid_scene(scene) -> bool:
+    return isinstance(scene, dict) and all(key in scene for key in SCENE_KEYS)
+
+
+def _stream_scenes(prompt: str, on_scene: Callable[[dict], None]) -> list:
+    """Streams the script reply, calling on_scene for each scene as soon as it is complete."""
+    parser = IncrementalJSONParser(key="script")
+    scenes = []
+    for delta in chat_json(prompt, SCRIPT_SCHEMA, "video_script", stream=True):
+        for scene in parser.feed(delta):
+            if _valid_scene(scene):
+                scenes.append(scene)
+                on_scene(scene)
+    # The final scene only completes with the document (or is cut off if the reply was truncated)
+    for scene in parser.close():
+        if _valid_scene(scene):
+            scenes.append(scene)
+            on_scene(scene)
+    try:
+        _, complete = parse_json_lenient(parser.text, dict)
+        outcome = 'complete' if complete else 'repaired'
+    except ValueError:
+        outcome = 'failed'
+    JSON_PARSES.inc(node=current_node.get(), outcome=outcome)
+    return scenes
+
+
+@instrument_node('creation_of_scripts')
+def creation_of_scripts_node(state, on_scene: Optional[Callable[[dict], None]] = None):
     selected_concept = state.get('selected_concept') or ''
     # If not explicitly set, fallback to the first idea from creative_director output
     if not selected_concept:
@@ -98,6 +208,8 @@ def creation_of_scripts_node(state):
             except Exception:
                 selected_concept = cd_text
 
+    supplemental_context, _ = project_state('creation_of_scripts', state)
+
     system_prompt = (f"""You are the Script Writer AI Agent. Your job is to take the approved creative concept and write a 30-second video script.
 
     You must output ONLY a valid JSON object and nothing else.
@@ -120,22 +232,35 @@ def creation_of_scripts_node(state):
     {selected_concept}
 
     Here is supplemental brand and context information (for tone and framing only):
-    {state}""")
+    {supplemental_context}""")
 
-    script_json_string = chat_with_openrouter(system_prompt)
     try:
-        parsed_script = json.loads(script_json_string)
-        if os.getenv('DEBUG_LLM') == '1':
-            print("Successfully parsed script JSON.")
-        return {"scripts_created": parsed_script}
-    except json.JSONDecodeError as e:
+        if on_scene is not None:
+            scenes = _stream_scenes(system_prompt, on_scene)
+        else:
+            parsed_script = chat_json(system_prompt, SCRIPT_SCHEMA, "video_script")
+            scenes = parsed_script.get("script") if isinstance(parsed_script, dict) else parsed_script
+            # A truncated reply keeps its complete scenes; a half-written last scene is dropped
+            scenes = [scene for scene in scenes or [] if _valid_scene(scene)]
+    except LLMError as e:
         if os.getenv('DEBUG_LLM') == '1':
-            print(f"Error: Failed to decode script JSON. {e}")
-            print(f"Received string: {script_json_string}")
+            print(f"Error: Failed to get a script. {e}")
         return {"scripts_created": {"script": []}}
+    if os.getenv('DEBUG_LLM') == '1':
+        print(f"Parsed script JSON with {len(scenes)} scene(s).")
+    return {"scripts_created": {"script": scenes}}
+
+
+# Placeholder themes used when the themes call fails; never worth reusing or storing
+FALLBACK_GLOBAL_THEMES = {"global_theme": "generic theme", "global_figures": "generic figure"}
+
+
+def is_fallback_themes(themes) -> bool:
+    return not themes or themes == FALLBACK_GLOBAL_THEMES
 
 
 # REFACTORED NODE
+@instrument_node('generate_global_themes')
 def generate_global_themes_node(state: GraphState):
     if os.getenv('DEBUG_LLM') == '1':
         print("Generating global themes and figures for the entire script...")
@@ -160,18 +285,14 @@ def generate_global_themes_node(state: GraphState):
 
     if os.getenv('DEBUG_LLM') == '1':
         print("Analyzing all scenes in a single batch...")
-    themes_json_string = chat_with_openrouter(
-        theme_generation_system_prompt,
-        all_scenes_json_string
-    )
-
     generated_data = {}
     try:
         # We now expect a single dictionary object
-        parsed_data = json.loads(themes_json_string)
+        parsed_data = chat_json(theme_generation_system_prompt, THEMES_SCHEMA, "global_themes",
+                                all_scenes_json_string)
 
-        if not isinstance(parsed_data, dict):
-            raise json.JSONDecodeError("Expected a JSON object, not a list.", themes_json_string, 0)
+        if not isinstance(parsed_data, dict) or not parsed_data.get("global_theme"):
+            raise ValueError(f"Expected a JSON object with global_theme, got: {parsed_data!r}")
 
         generated_data = parsed_data
         if os.getenv('DEBUG_LLM') == '1':
@@ -179,32 +300,19 @@ def generate_global_themes_node(state: GraphState):
             print(f"  - Global Theme: {generated_data.get('global_theme')}")
             print(f"  - Global Figures: {generated_data.get('global_figures')}")
 
-    except json.JSONDecodeError as e:
+    except (LLMError, ValueError) as e:
         if os.getenv('DEBUG_LLM') == '1':
-            print(f"Error: Failed to decode global themes JSON object. {e}")
-            print(f"Received string: {themes_json_string}")
+            print(f"Error: Failed to get global themes JSON object. {e}")
         # Provide a fallback *object*
-        generated_data = {"global_theme": "generic theme", "global_figures": "generic figure"}
+        generated_data = dict(FALLBACK_GLOBAL_THEMES)
         if os.getenv('DEBUG_LLM') == '1':
             print("Using fallback data.")
 
     return {"global_themes_and_figures": generated_data}
 
 
-# REFACTORED NODE
-def generate_frame_prompts_node(state: GraphState):
-    if os.getenv('DEBUG_LLM') == '1':
-        print("Generating starting frame prompts for each scene...")
-    scenes = state["scripts_created"].get("script", [])
-    # Get the single global themes dictionary
-    global_data = state.get("global_themes_and_figures", {})
-    global_theme = global_data.get("global_theme", "")
-    global_figures = global_data.get("global_figures", "")
-
-    generated_prompts = []
-
-    # This prompt is updated to accept global context
-    prompt_generation_system_prompt = """You are an expert prompt engineer for an AI image generator (like DALL-E 3 or Midjourney). 
+# This prompt is updated to accept global context
+FRAME_PROMPT_SYSTEM_PROMPT = """You are an expert prompt engineer for an AI image generator (like DALL-E 3 or Midjourney). 
     You will be given:
     1.  Details for one **specific scene** (setting, visual description).
     2.  The **global, overarching theme** for the entire video.
@@ -217,9 +325,31 @@ def generate_frame_prompts_node(state: GraphState):
 
     Your response must be ONLY the prompt itself, with no extra text."""
 
-    for scene in scenes:
-        # Create a detailed input for the prompt generator LLM
-        scene_details = f"""
+BATCH_FRAME_PROMPT_SYSTEM_PROMPT = """You are an expert prompt engineer for an AI image generator (like DALL-E 3 or Midjourney).
+    You will be given:
+    1.  A JSON array of **all scenes** of a video script (each with a "scene_number", setting and visual description).
+    2.  The **global, overarching theme** for the entire video.
+    3.  The **global list of all figures** appearing in the video.
+
+    For EACH scene, write a single, concise, and highly descriptive prompt to generate a photorealistic starting frame for *that specific scene*.
+    -   Each prompt must be *specific* to its scene's details (setting, action).
+    -   Each prompt must also *incorporate* the global theme.
+    -   A prompt should only include figures if they are *mentioned* in that scene's description, drawing from the global figure list for consistency.
+
+    You must output ONLY a valid JSON array with exactly one object per scene, in scene order.
+    Each object must have two keys: "scene_number" (Number, copied from the scene) and "prompt" (String).
+    Do not add any text before or after the JSON array."""
+
+# Maximum number of scene prompt requests in flight at once
+FRAME_PROMPT_CONCURRENCY = int(os.getenv('FRAME_PROMPT_CONCURRENCY', '8'))
+# "per_scene": one request per scene; "batched": one request for the whole script,
+# with individual retries only for scenes missing from the reply
+FRAME_PROMPT_MODE = os.getenv('FRAME_PROMPT_MODE', 'per_scene')
+
+
+def build_scene_prompt_details(scene: dict, global_theme: str, global_figures: str) -> str:
+    # Create a detailed input for the prompt generator LLM
+    return f"""
         Generate an image prompt for this specific scene:
 
         **Specific Scene Details:**
@@ -237,15 +367,137 @@ def generate_frame_prompts_node(state: GraphState):
         Remember: Create a prompt for the *specific scene*, colored by the *global theme*. Only include figures from the global list if they are *in this scene's visual description*.
         """
 
-        # Call the LLM to generate the image prompt
-        image_prompt = chat_with_openrouter(prompt_generation_system_prompt, scene_details)
 
-        # Clean up the prompt (e.g., remove potential quotes)
-        cleaned_prompt = image_prompt.strip().strip('"')
+def _clean_frame_prompt(image_prompt: str) -> str:
+    # Clean up the prompt (e.g., remove potential quotes)
+    return (image_prompt or '').strip().strip('"')
+
+
+def generate_frame_prompt(scene: dict, global_theme: str, global_figures: str) -> str:
+    """Generates the image prompt for a single scene."""
+    scene_details = build_scene_prompt_details(scene, global_theme, global_figures)
+    with node_context('generate_frame_prompts'):
+        return _clean_frame_prompt(chat_with_openrouter(FRAME_PROMPT_SYSTEM_PROMPT, scene_details))
+
+
+async def agenerate_frame_prompts(scenes: List[dict], global_theme: str, global_figures: str,
+                                  concurrency: int = FRAME_PROMPT_CONCURRENCY) -> List[str]:
+    """
+    Generates one image prompt per scene with all requests in flight at once.
+
+    At most `concurrency` requests run simultaneously. The result keeps the scene
+    order, and a failing scene yields an empty prompt without affecting the others.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(scene: dict) -> str:
+        async with semaphore:
+            scene_details = build_scene_prompt_details(scene, global_theme, global_figures)
+            return _clean_frame_prompt(await achat_with_openrouter(FRAME_PROMPT_SYSTEM_PROMPT, scene_details))
 
-        generated_prompts.append(cleaned_prompt)
+    results = await asyncio.gather(*(_one(scene) for scene in scenes), return_exceptions=True)
+
+    generated_prompts = []
+    for scene, result in zip(scenes, results):
+        if isinstance(result, BaseException):
+            if os.getenv('DEBUG_LLM') == '1':
+                print(f"  - Prompt for Scene {scene.get('scene_number')} failed: {result}")
+            result = ''
+        elif os.getenv('DEBUG_LLM') == '1':
+            print(f"  - Prompt for Scene {scene.get('scene_number')}: {result}")
+        generated_prompts.append(result)
+    return generated_prompts
+
+
+def _parse_batched_prompts(text: str, scenes: List[dict]) -> dict:
+    """Maps scene index -> prompt for every usable entry in a batched reply."""
+    try:
+        # Tolerates fences and truncation: the prompts that did arrive are kept
+        parsed, _ = parse_json_lenient(text)
+    except ValueError:
+        return {}
+    if isinstance(parsed, dict):
+        parsed = parsed.get('prompts') or parsed.get('frame_prompts') or []
+    if not isinstance(parsed, list):
+        return {}
+
+    index_by_number = {}
+    for i, scene in enumerate(scenes):
+        index_by_number.setdefault(str(scene.get('scene_number')), i)
+
+    prompts = {}
+    for position, item in enumerate(parsed):
+        if not isinstance(item, dict):
+            continue
+        prompt = _clean_frame_prompt(str(item.get('prompt') or ''))
+        # Match on scene_number; fall back to position when the number is absent
+        number = item.get('scene_number')
+        index = index_by_number.get(str(number)) if number is not None else position
+        if prompt and index is not None and index < len(scenes):
+            prompts.setdefault(index, prompt)
+    return prompts
+
+
+async def agenerate_frame_prompts_batched(scenes: List[dict], global_theme: str, global_figures: str,
+                                          concurrency: int = FRAME_PROMPT_CONCURRENCY) -> List[str]:
+    """
+    Generates all scene prompts with a single request.
+
+    Scenes the reply leaves out (or a reply that fails to parse or fails
+    outright) are retried individually through agenerate_frame_prompts.
+    """
+    if not scenes:
+        return []
+    batch_input = json.dumps({
+        "global_theme": global_theme,
+        "global_figures": global_figures,
+        "scenes": [
+            {key: scene.get(key) for key in ("scene_number", "timestamp_start", "timestamp_end", "setting",
+                                             "visual_description", "text_on_screen", "audio_cue")}
+            for scene in scenes
+        ],
+    }, indent=2)
+
+    try:
+        reply = await achat_with_openrouter(BATCH_FRAME_PROMPT_SYSTEM_PROMPT, batch_input)
+    except LLMError as e:
         if os.getenv('DEBUG_LLM') == '1':
-            print(f"  - Prompt for Scene {scene.get('scene_number')}: {cleaned_prompt}")
+            print(f"Batched frame prompt request failed: {e}")
+        reply = ''
+    prompts = _parse_batched_prompts(reply, scenes)
+
+    missing = [i for i in range(len(scenes)) if i not in prompts]
+    if missing:
+        if os.getenv('DEBUG_LLM') == '1':
+            print(f"Batched reply missing {len(missing)} scene(s); retrying them individually.")
+        retried = await agenerate_frame_prompts([scenes[i] for i in missing], global_theme, global_figures, concurrency)
+        prompts.update(zip(missing, retried))
+
+    return [prompts[i] for i in range(len(scenes))]
+
+
+def generate_frame_prompts(scenes: List[dict], global_theme: str, global_figures: str,
+                           mode: str = None) -> List[str]:
+    """Generates every scene's frame prompt using the configured FRAME_PROMPT_MODE."""
+    with node_context('generate_frame_prompts'):
+        if (mode or FRAME_PROMPT_MODE) == 'batched':
+            return run_sync(agenerate_frame_prompts_batched(scenes, global_theme, global_figures))
+        # Send every scene's request concurrently instead of one after another
+        return run_sync(agenerate_frame_prompts(scenes, global_theme, global_figures))
+
+
+# REFACTORED NODE
+@instrument_node('generate_frame_prompts')
+def generate_frame_prompts_node(state: GraphState):
+    if os.getenv('DEBUG_LLM') == '1':
+        print("Generating starting frame prompts for each scene...")
+    scenes = state["scripts_created"].get("script", [])
+    # Get the single global themes dictionary
+    global_data = state.get("global_themes_and_figures", {})
+    global_theme = global_data.get("global_theme", "")
+    global_figures = global_data.get("global_figures", "")
+
+    generated_prompts = generate_frame_prompts(scenes, global_theme, global_figures)
 
     return {"frame_prompts": generated_prompts}
 
@@ -264,20 +516,164 @@ def check_user_happiness(state: GraphState):
         return "creative_director"
 
 
-if __name__ == "__main__":
-    # Build and run the offline workflow only when executing this file directly
+def write_brand_strategy(state: dict, out_dir: str = ".") -> str:
+    path = os.path.join(out_dir, "brand_strategy.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(state.get('summary_plan_audience') or 'No content generated.')
+    return path
+
+
+def write_creative_concept(state: dict, out_dir: str = ".") -> str:
+    path = os.path.join(out_dir, "creative_concept.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(state.get('creative_director_node') or 'No content generated.')
+    return path
+
+
+def write_final_script(state: dict, out_dir: str = ".") -> str:
+    path = os.path.join(out_dir, "final_script.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state.get('scripts_created', {}), f, indent=4)
+    return path
+
+
+def write_global_themes(state: dict, out_dir: str = ".") -> str:
+    path = os.path.join(out_dir, "global_themes_and_figures.md")
+    with open(path, "w", encoding="utf-8") as f:
+        themes = state.get('global_themes_and_figures', {})
+        f.write("# Generated Global Themes and Figures\n\n")
+        if not themes:
+            f.write("No global themes or figures were generated.")
+        else:
+            f.write(f"**Global Theme:** {themes.get('global_theme', 'N/A')}\n\n")
+            f.write(f"**Global Figures:** {themes.get('global_figures', 'N/A')}\n")
+    return path
+
+
+def write_frame_prompts(state: dict, out_dir: str = ".") -> str:
+    path = os.path.join(out_dir, "frame_prompts.md")
+    with open(path, "w", encoding="utf-8") as f:
+        prompts = state.get('frame_prompts', [])
+        f.write("# Generated Frame Prompts (Combined with Globals)\n\n")
+        if not prompts:
+            f.write("No prompts were generated.")
+        for i, prompt in enumerate(prompts, 1):
+            f.write(f"## Scene {i}\n")
+            f.write(f"{prompt}\n\n")
+    return path
+
+
+# Output file written as soon as each node finishes
+OUTPUT_WRITERS = {
+    "brand_strategist": write_brand_strategy,
+    "creative_director": write_creative_concept,
+    "creation_of_scripts": write_final_script,
+    "generate_global_themes": write_global_themes,
+    "generate_frame_prompts": write_frame_prompts,
+}
+
+
+def write_node_output(node: str, state: dict, out_dir: str = ".") -> None:
+    writer = OUTPUT_WRITERS.get(node)
+    if writer is None:
+        return
+    try:
+        print(f"Saved {writer(state, out_dir)}")
+    except IOError as e:
+        print(f"\nError writing {node} output to disk: {e}")
+
+
+def run_workflow(compiled, run_id: str, resume: bool = False, out_dir: str = ".", inputs: dict = None) -> dict:
+    """
+    Streams the compiled (checkpointed) workflow for `run_id`, writing each node's output file as it finishes.
+
+    `inputs` seeds the state of a new run (e.g. its brand_source). With `resume`,
+    execution continues after the last checkpointed node instead of starting over.
+    Returns the final state.
+    """
+    config = {"configurable": {"thread_id": run_id}}
+    state = dict(inputs or {})
+    graph_input = dict(inputs or {})
+    if resume:
+        snapshot = compiled.get_state(config)
+        if not snapshot.values:
+            raise ValueError(f"No checkpoint found for run {run_id}")
+        state = dict(snapshot.values)
+        if not snapshot.next:
+            print(f"Run {run_id} already completed; rewriting its outputs.")
+            for node in OUTPUT_WRITERS:
+                write_node_output(node, state, out_dir)
+            return state
+        print(f"Resuming run {run_id} at {', '.join(snapshot.next)}")
+        # None continues from the checkpoint instead of starting a new pass
+        graph_input = None
+
+    for update in compiled.stream(graph_input, config, stream_mode="updates"):
+        for node, values in update.items():
+            state.update(values or {})
+            write_node_output(node, state, out_dir)
+    return state
+
+
+def _brand_source_digest(state: dict) -> str:
+    source = state.get("brand_source") or DEFAULT_BRAND_SOURCE
+    if not is_url(source):
+        return file_digest(source)
+    # A website changes without its URL changing; re-research it once per brand cache TTL
+    return f"{source}@{int(time.time() // BRAND_CACHE_TTL)}"
+
+
+# What each node reads, for memoized offline runs: node -> (inputs from state, helpers whose code shapes the output)
+MEMO_INPUTS = {
+    "research_agent": (lambda state: {"brand_source": _brand_source_digest(state)}, ()),
+    "brand_strategist": (lambda state: projection_inputs("brand_strategist", state),
+                         (build_brand_strategist_prompt,)),
+    "creative_director": (lambda state: projection_inputs("creative_director", state),
+                          (build_creative_director_prompt,)),
+    "creation_of_scripts": (lambda state: {"selected_concept": state.get("selected_concept"),
+                                           "creative_director_node": state.get("creative_director_node"),
+                                           **projection_inputs("creation_of_scripts", state)},
+                            (_stream_scenes, _valid_scene, SCRIPT_SCHEMA)),
+    "generate_global_themes": (lambda state: {"scripts_created": state.get("scripts_created")},
+                               (THEMES_SCHEMA, FALLBACK_GLOBAL_THEMES)),
+    "generate_frame_prompts": (lambda state: {"scripts_created": state.get("scripts_created"),
+                                              "global_themes_and_figures": state.get("global_themes_and_figures"),
+                                              "mode": FRAME_PROMPT_MODE},
+                               (build_scene_prompt_details, generate_frame_prompt, agenerate_frame_prompts,
+                                agenerate_frame_prompts_batched, _parse_batched_prompts, _clean_frame_prompt,
+                                FRAME_PROMPT_SYSTEM_PROMPT, BATCH_FRAME_PROMPT_SYSTEM_PROMPT)),
+}
+
+# Fallback or empty results the nodes return after a failed LLM call; these are never memoized
+# or served from a speculative run
+DEGRADED_RESULTS = {
+    "brand_strategist": lambda result: not result.get("summary_plan_audience"),
+    "creation_of_scripts": lambda result: not (result.get("scripts_created") or {}).get("script"),
+    "generate_global_themes": lambda result: is_fallback_themes(result.get("global_themes_and_figures")),
+    "generate_frame_prompts": lambda result: not all(result.get("frame_prompts") or [""]),
+}
+
+
+def build_workflow(memo: NodeMemo = None) -> StateGraph:
+    """Builds the offline workflow; with `memo`, nodes whose inputs are unchanged reuse their stored result."""
+    def node(name, fn):
+        if memo is not None and name in MEMO_INPUTS:
+            inputs, code = MEMO_INPUTS[name]
+            return memo.wrap(name, fn, inputs, code, degraded=DEGRADED_RESULTS.get(name))
+        return fn
+
     workflow = StateGraph(GraphState)
 
     # Add nodes
-    workflow.add_node("research_agent", research_agent_node)
-    workflow.add_node("brand_strategist", brand_strategist_node)
+    workflow.add_node("research_agent", node("research_agent", research_agent_node))
+    workflow.add_node("brand_strategist", node("brand_strategist", brand_strategist_node))
     workflow.add_node("user_feedback_yes_no", user_feedback_yes_no_node)
-    workflow.add_node("creative_director", creative_director_node)
+    workflow.add_node("creative_director", node("creative_director", creative_director_node))
     workflow.add_node("br_feedback", br_feedback_node)
     workflow.add_node("user_feedback_loop", user_feedback_loop_node)
-    workflow.add_node("creation_of_scripts", creation_of_scripts_node)
-    workflow.add_node("generate_global_themes", generate_global_themes_node)
-    workflow.add_node("generate_frame_prompts", generate_frame_prompts_node)
+    workflow.add_node("creation_of_scripts", node("creation_of_scripts", creation_of_scripts_node))
+    workflow.add_node("generate_global_themes", node("generate_global_themes", generate_global_themes_node))
+    workflow.add_node("generate_frame_prompts", node("generate_frame_prompts", generate_frame_prompts_node))
 
     # Entry and edges
     workflow.set_entry_point("research_agent")
@@ -300,47 +696,50 @@ if __name__ == "__main__":
     workflow.add_edge("creation_of_scripts", "generate_global_themes")
     workflow.add_edge("generate_global_themes", "generate_frame_prompts")
     workflow.add_edge("generate_frame_prompts", END)
+    return workflow
 
-    compiled = workflow.compile()
 
-    final_state = compiled.invoke({})
-    try:
-        print("\nSaving outputs to files...")
-
-        with open("brand_strategy.md", "w", encoding="utf-8") as f:
-            f.write(final_state.get('summary_plan_audience', 'No content generated.'))
-
-        with open("creative_concept.md", "w", encoding="utf-8") as f:
-            f.write(final_state.get('creative_director_node', 'No content generated.'))
-
-        with open("final_script.json", "w", encoding="utf-8") as f:
-            script_data = final_state.get('scripts_created', {})
-            json.dump(script_data, f, indent=4)
-
-        with open("global_themes_and_figures.md", "w", encoding="utf-8") as f:
-            themes = final_state.get('global_themes_and_figures', {})
-            f.write("# Generated Global Themes and Figures\n\n")
-            if not themes:
-                f.write("No global themes or figures were generated.")
-            else:
-                f.write(f"**Global Theme:** {themes.get('global_theme', 'N/A')}\n\n")
-                f.write(f"**Global Figures:** {themes.get('global_figures', 'N/A')}\n")
-
-        with open("frame_prompts.md", "w", encoding="utf-8") as f:
-            prompts = final_state.get('frame_prompts', [])
-            f.write("# Generated Frame Prompts (Combined with Globals)\n\n")
-            if not prompts:
-                f.write("No prompts were generated.")
-            for i, prompt in enumerate(prompts, 1):
-                f.write(f"## Scene {i}\n")
-                f.write(f"{prompt}\n\n")
-
-        print("Successfully saved 5 files.")
-
-    except KeyError as e:
-        print(f"\nError: A key was missing from the final state: {e}")
-    except IOError as e:
-        print(f"\nError writing files to disk: {e}")
+if __name__ == "__main__":
+    # Build and run the offline workflow only when executing this file directly
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    parser = argparse.ArgumentParser(description="Run the offline FrameAgent workflow.")
+    parser.add_argument("--no-memo", action="store_true", help="recompute every node instead of reusing stored results")
+    parser.add_argument("--clear-memo", action="store_true", help="drop all stored node results before running")
+    parser.add_argument("--brand", default=DEFAULT_BRAND_SOURCE, help="brand JSON file or website URL to start from")
+    parser.add_argument("--resume", metavar="RUN_ID", help="continue a previous run from its last completed node")
+    parser.add_argument("--checkpoint-db", default=os.getenv('CHECKPOINT_PATH', os.path.join('.cache', 'checkpoints.sqlite')),
+                        help="SQLite file the per-node checkpoints are written to")
+    args = parser.parse_args()
+
+    memo = None
+    if not args.no_memo:
+        memo = create_node_memo()
+        if args.clear_memo:
+            memo.cache.clear()
+
+    run_id = args.resume or time.strftime("%Y%m%d-%H%M%S")
+    checkpoint_dir = os.path.dirname(args.checkpoint_db)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    with SqliteSaver.from_conn_string(args.checkpoint_db) as checkpointer:
+        compiled = build_workflow(memo).compile(checkpointer=checkpointer)
+        print(f"Run id: {run_id}")
+        try:
+            run_workflow(compiled, run_id, resume=bool(args.resume), inputs={"brand_source": args.brand})
+        except Exception as e:
+            print(f"\nRun {run_id} failed: {e}")
+            print(f"Completed nodes are checkpointed; continue with: python main.py --resume {run_id}")
+            raise SystemExit(1)
+
+    elapsed = time.perf_counter() - started
+    if memo is not None:
+        print(f"\nWorkflow finished in {elapsed:.2f}s: reused {len(memo.reused)} node(s), "
+              f"recomputed {len(memo.recomputed)} ({', '.join(memo.recomputed) or 'none'})")
+    else:
+        print(f"\nWorkflow finished in {elapsed:.2f}s")
 
     try:
         img = compiled.get_graph().draw_mermaid_png()
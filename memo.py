@@ -0,0 +1,84 @@
+import hashlib
+import inspect
+import json
+import os
+from typing import Callable, Iterable, Optional
+from disk_cache import DiskCache
+from hashing import fingerprint
+from llm_library import OPENROUTER_BASE_URL, TEXT_MODEL
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's contents ('' if it cannot be read), for nodes that read files."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ''
+
+
+def _code_digest(code: Iterable) -> str:
+    # Editing a node, its prompt builder, or a prompt/schema constant invalidates its memoized results
+    sources = []
+    for item in code:
+        if not callable(item):
+            # Prompt strings, JSON schemas and other constants are hashed by value
+            sources.append(item)
+            continue
+        fn = inspect.unwrap(item)
+        try:
+            sources.append(inspect.getsource(fn))
+        except (OSError, TypeError):
+            sources.append(f"{fn.__module__}.{fn.__qualname__}")
+    return fingerprint(*sources)
+
+
+class NodeMemo:
+    """
+    Persistent memoization of pipeline nodes, keyed on the inputs each node reads.
+
+    A node's key combines its name, its source code (and that of any helpers
+    or constants passed as `code`), the backend URL and text model, and the
+    values returned by its `inputs` function. Results are stored as JSON in a
+    DiskCache, so a rerun only recomputes the nodes whose inputs changed. A
+    node that raises stores nothing, and neither does one whose result
+    `degraded` flags (a fallback returned after a failed LLM call).
+    """
+
+    def __init__(self, cache: DiskCache):
+        self.cache = cache
+        self.reused = []
+        self.recomputed = []
+
+    def wrap(self, node: str, fn: Callable, inputs: Callable[[dict], dict],
+             code: Iterable = (), degraded: Optional[Callable[[dict], bool]] = None) -> Callable:
+        code_digest = _code_digest([fn, *code])
+
+        def memoized(state):
+            key = fingerprint(node, OPENROUTER_BASE_URL, TEXT_MODEL, code_digest, inputs(state))
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.reused.append(node)
+                if os.getenv('DEBUG_LLM') == '1':
+                    print(f"[memo] {node}: inputs unchanged, reusing stored result")
+                return json.loads(cached)
+            result = fn(state)
+            self.recomputed.append(node)
+            if degraded is not None and degraded(result):
+                if os.getenv('DEBUG_LLM') == '1':
+                    print(f"[memo] {node}: fallback result, not stored")
+                return result
+            self.cache.set(key, json.dumps(result, ensure_ascii=False))
+            return result
+
+        memoized.__name__ = getattr(fn, '__name__', node)
+        return memoized
+
+
+def create_node_memo() -> NodeMemo:
+    """Builds the memo from NODE_MEMO_PATH and NODE_MEMO_MAX_MB."""
+    cache = DiskCache(
+        os.getenv('NODE_MEMO_PATH', os.path.join('.cache', 'node_memo.sqlite')),
+        max_bytes=int(os.getenv('NODE_MEMO_MAX_MB', '100')) * 1024 * 1024,
+    )
+    return NodeMemo(cache)
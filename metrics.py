@@ -0,0 +1,249 @@
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Name of the pipeline node currently running, used to label LLM metrics
+current_node: contextvars.ContextVar[str] = contextvars.ContextVar('current_node', default='none')
+
+# Per-run token totals collected by track_usage()
+_usage_totals: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar('usage_totals', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """A value per label set that can go up and down."""
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """Observations bucketed per label set, rendered with cumulative buckets, sum and count."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [cumulative bucket counts, sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {bucket_count}")
+                inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    'llm_request_duration_seconds', 'Latency of OpenRouter requests.', ('model', 'node'))
+LLM_PROMPT_TOKENS = REGISTRY.counter(
+    'llm_prompt_tokens_total', 'Prompt tokens reported by OpenRouter.', ('model', 'node'))
+LLM_COMPLETION_TOKENS = REGISTRY.counter(
+    'llm_completion_tokens_total', 'Completion tokens reported by OpenRouter.', ('model', 'node'))
+LLM_CACHED_TOKENS = REGISTRY.counter(
+    'llm_cached_tokens_total', 'Prompt tokens served from the provider prompt cache.', ('model', 'node'))
+LLM_ERRORS = REGISTRY.counter(
+    'llm_errors_total', 'Failed OpenRouter requests.', ('model', 'node', 'error'))
+LLM_RETRIES = REGISTRY.counter(
+    'llm_retries_total', 'OpenRouter requests retried after a throttled or transient failure.', ('model', 'reason'))
+LLM_TRUNCATIONS = REGISTRY.counter(
+    'llm_truncations_total', 'Completions cut off at max_tokens, by whether a continuation followed.',
+    ('model', 'node', 'action'))
+LLM_MAX_TOKENS = REGISTRY.gauge(
+    'llm_max_tokens', 'Current completion token budget per node, derived from observed output sizes.', ('node',))
+LLM_CONCURRENCY_LIMIT = REGISTRY.gauge(
+    'llm_concurrency_limit', 'Current adaptive limit of OpenRouter requests in flight.', ('model',))
+JSON_PARSES = REGISTRY.counter(
+    'llm_json_parses_total', 'Structured (JSON) replies by parse outcome: complete, repaired or failed.', ('node', 'outcome'))
+CACHE_REQUESTS = REGISTRY.counter(
+    'cache_requests_total', 'Lookups in the local completion and image caches.', ('cache', 'result'))
+PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    'prompt_projection_tokens_saved_total', 'Estimated prompt tokens saved by state projection.', ('node',))
+SPECULATION_RESULTS = REGISTRY.counter(
+    'speculation_results_total', 'Outcomes of speculative next-step runs.', ('node', 'outcome'))
+NODE_SECONDS = REGISTRY.histogram(
+    'node_duration_seconds', 'Duration of pipeline node executions.', ('node',))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Duration of Flask requests until the response is returned.',
+    ('route', 'method', 'status'))
+
+
+@contextlib.contextmanager
+def node_context(node: str):
+    """Labels LLM metrics recorded inside the block with `node`."""
+    token = current_node.set(node)
+    try:
+        yield
+    finally:
+        current_node.reset(token)
+
+
+def instrument_node(node: str):
+    """Decorator timing a pipeline node and labelling the LLM calls it makes."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with node_context(node), NODE_SECONDS.time(node=node):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def track_usage():
+    """
+    Collects the token counts of every LLM request made inside the block (and in
+    threads or tasks started from it with a copy of the context) into a dict.
+    """
+    totals = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0}
+    token = _usage_totals.set(totals)
+    try:
+        yield totals
+    finally:
+        _usage_totals.reset(token)
+
+
+_usage_lock = threading.Lock()
+
+
+def record_usage(model: str, usage) -> None:
+    """Adds the token counts from an OpenAI-style `usage` object to the counters."""
+    if usage is None:
+        return
+    node = current_node.get()
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = (getattr(details, 'cached_tokens', 0) or 0) if details is not None else 0
+    LLM_PROMPT_TOKENS.inc(prompt_tokens, model=model, node=node)
+    LLM_COMPLETION_TOKENS.inc(completion_tokens, model=model, node=node)
+    if cached:
+        LLM_CACHED_TOKENS.inc(cached, model=model, node=node)
+    totals = _usage_totals.get()
+    if totals is not None:
+        with _usage_lock:
+            totals['requests'] += 1
+            totals['prompt_tokens'] += prompt_tokens
+            totals['completion_tokens'] += completion_tokens
+            totals['cached_tokens'] += cached
@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import email.utils
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Refills at `rate_per_minute` up to `capacity` (one minute's worth by default).
+
+    `reserve` takes tokens immediately, letting the balance go negative, and
+    returns how long the caller has to wait before it may proceed. That keeps
+    waiting callers in arrival order without holding a lock while they sleep.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # A single request larger than the bucket only waits for a full bucket
+            amount = min(amount, self.capacity)
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate) if self.rate else 0.0
+
+    def adjust(self, amount: float) -> None:
+        """Gives back (positive) or takes (negative) tokens once the real cost of a request is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit adjusted AIMD-style: +1 per limit's worth of successful
+    requests, halved when the provider throttles (at most once per `cooldown`).
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 32, cooldown: float = 2.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = now
+
+
+class RateLimiter:
+    """
+    Process-wide limits for one model: requests per minute, tokens per minute
+    and an adaptive number of requests in flight.
+
+    Callers hold a `slot` (or `aslot` in async code) for the duration of a
+    request, passing their estimated token cost, and report the outcome with
+    `on_success` / `on_throttle`.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, concurrency: int = 8,
+                 min_concurrency: int = 1, max_concurrency: int = 32):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = AdaptiveConcurrency(concurrency, min_concurrency, max_concurrency)
+
+    def _reserve(self, tokens: int) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    @contextlib.contextmanager
+    def slot(self, tokens: int = 0):
+        delay = self._reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        self.concurrency.acquire()
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, tokens: int = 0):
+        delay = self._reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        # Polling keeps the event loop free while the concurrency limit is reached
+        while not self.concurrency.try_acquire():
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+    def record_tokens(self, estimated: int, actual: int) -> None:
+        """Corrects the token bucket with the usage the provider reported."""
+        if self.tokens is not None and actual:
+            self.tokens.adjust(estimated - actual)
+
+    def on_success(self) -> None:
+        self.concurrency.on_success()
+
+    def on_throttle(self) -> None:
+        self.concurrency.on_throttle()
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait according to Retry-After (seconds or HTTP date) or retry-after-ms, if present."""
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before retry number `attempt` (0-based): exponential backoff with full
+    jitter capped at `cap`, or the server's Retry-After (plus a little jitter)
+    when it sent one.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base / 2)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional, Tuple
+from metrics import SPECULATION_RESULTS
+
+
+class SpeculativeExecutor:
+    """
+    Runs likely next workflow steps in the background before the user asks for them.
+
+    Each speculative run is stored under (session id, node, input fingerprint).
+    `take` hands back the result only when the caller's fingerprint matches and
+    discards every other run for that node. Concurrency is capped by `workers`,
+    cost by `max_calls` runs per session (reset by `discard`), and unclaimed runs
+    are dropped after `ttl` seconds.
+    """
+
+    def __init__(self, enabled: bool = False, workers: int = 4, max_calls: int = 10, ttl: float = 1800):
+        self.enabled = enabled
+        self.max_calls = max_calls
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='speculative') if enabled else None
+        # (session id, node) -> {fingerprint: (started_at, future)}
+        self._runs: Dict[Tuple[str, str], Dict[str, Tuple[float, Future]]] = {}
+        # session id -> (runs started, last start time)
+        self._calls: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id: str, node: str, key: str, fn: Callable, *args) -> bool:
+        """Starts fn(*args) for `node` unless disabled, already running for `key`, or over the session's cap."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            self._purge_expired()
+            runs = self._runs.setdefault((session_id, node), {})
+            if key in runs:
+                return True
+            calls, _ = self._calls.get(session_id, (0, 0))
+            if calls >= self.max_calls:
+                SPECULATION_RESULTS.inc(node=node, outcome='capped')
+                return False
+            now = time.time()
+            self._calls[session_id] = (calls + 1, now)
+            runs[key] = (now, self._executor.submit(fn, *args))
+        if os.getenv('DEBUG_LLM') == '1':
+            print(f"[speculation] started {node} for session {session_id}")
+        return True
+
+    def take(self, session_id: str, node: str, key: str, timeout: float = None,
+             degraded: Optional[Callable[[dict], bool]] = None):
+        """
+        Returns the speculative result for `node` if it was computed from the same inputs.
+
+        A matching run that is still in flight is waited on for up to `timeout`
+        seconds, since it is the same call the caller would otherwise make. Returns
+        None when there is no usable result (no match, the run raised, or its
+        result is empty or flagged by `degraded`); the caller then runs the node itself.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            runs = self._runs.pop((session_id, node), {})
+        match = runs.pop(key, None)
+        for _, future in runs.values():
+            # Inputs changed: cancel what has not started; finished or running work is ignored
+            future.cancel()
+            SPECULATION_RESULTS.inc(node=node, outcome='discarded')
+        if match is None:
+            SPECULATION_RESULTS.inc(node=node, outcome='miss')
+            return None
+        try:
+            result = match[1].result(timeout=timeout)
+        except FutureTimeoutError:
+            match[1].cancel()
+            SPECULATION_RESULTS.inc(node=node, outcome='timeout')
+            return None
+        except Exception:
+            SPECULATION_RESULTS.inc(node=node, outcome='error')
+            return None
+        if not result or (degraded is not None and degraded(result)):
+            # A fallback from a failed call: the foreground run gets a real attempt
+            SPECULATION_RESULTS.inc(node=node, outcome='degraded')
+            return None
+        SPECULATION_RESULTS.inc(node=node, outcome='hit')
+        return result
+
+    def discard(self, session_id: str) -> None:
+        """Drops every speculative run for the session and resets its call budget."""
+        with self._lock:
+            for run_key in [k for k in self._runs if k[0] == session_id]:
+                for _, future in self._runs.pop(run_key).values():
+                    future.cancel()
+            self._calls.pop(session_id, None)
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        for run_key in list(self._runs):
+            runs = self._runs[run_key]
+            for key in [k for k, (started_at, _) in runs.items() if started_at < cutoff]:
+                runs.pop(key)[1].cancel()
+            if not runs:
+                del self._runs[run_key]
+        for session_id in [s for s, (_, last) in self._calls.items() if last < cutoff]:
+            del self._calls[session_id]
+
+
+def create_speculative_executor() -> SpeculativeExecutor:
+    """Builds the executor from SPECULATIVE_PREFETCH (opt-in, '1'), SPECULATIVE_WORKERS,
+    SPECULATIVE_MAX_CALLS and SPECULATIVE_TTL."""
+    return SpeculativeExecutor(
+        enabled=os.getenv('SPECULATIVE_PREFETCH') == '1',
+        workers=int(os.getenv('SPECULATIVE_WORKERS', '4')),
+        max_calls=int(os.getenv('SPECULATIVE_MAX_CALLS', '10')),
+        ttl=float(os.getenv('SPECULATIVE_TTL', '1800')),
+    )
@@ -0,0 +1,315 @@
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from uuid import uuid4
+from flask import Flask, Response, jsonify, request
+
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Matches llm_library._CONTINUE_PROMPT closely enough to recognise continuation requests
+CONTINUE_MARKER = "Continue exactly where it stopped"
+
+
+def _read(path: str, default: str = '') -> str:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return default
+
+
+def load_fixtures(fixture_dir: str = FIXTURE_DIR) -> dict:
+    """
+    Canned replies built from the sample outputs checked into the repo: the brand
+    strategy, the creative concepts (with their § separators), the script JSON,
+    the global themes and one frame prompt per scene.
+    """
+    script = _read(os.path.join(fixture_dir, 'final_script.json'), '{"script": []}')
+    themes_md = _read(os.path.join(fixture_dir, 'global_themes_and_figures.md'))
+    theme = re.search(r"\*\*Global Theme:\*\*\s*(.+)", themes_md)
+    figures = re.search(r"\*\*Global Figures:\*\*\s*(.+)", themes_md)
+    frame_prompts = {}
+    sections = re.split(r"^## Scene (\d+)\s*$", _read(os.path.join(fixture_dir, 'frame_prompts.md')), flags=re.M)
+    for number, body in zip(sections[1::2], sections[2::2]):
+        frame_prompts[int(number)] = body.strip()
+    return {
+        'brand_strategy': _read(os.path.join(fixture_dir, 'brand_strategy.md'), 'Brand strategy.').strip(),
+        'creative_concept': _read(os.path.join(fixture_dir, 'creative_concept.md'), 'Idea 1').strip(),
+        'script': json.dumps(json.loads(script), ensure_ascii=False),
+        'themes': json.dumps({
+            'global_theme': theme.group(1).strip() if theme else 'A visual journey',
+            'global_figures': figures.group(1).strip() if figures else 'A young professional',
+        }, ensure_ascii=False),
+        'frame_prompts': frame_prompts or {1: 'Photorealistic wide shot of a bright office.'},
+    }
+
+
+def _png(width: int, height: int, seed: str) -> bytes:
+    """A solid-colour RGB PNG (no Pillow needed); the colour is derived from `seed`."""
+    colour = hashlib.sha256(seed.encode('utf-8')).digest()[:3]
+    raw = b''.join(b'\x00' + colour * width for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b''))
+
+
+def _text_of(message: dict) -> str:
+    content = message.get('content')
+    if isinstance(content, list):
+        return ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content or ''
+
+
+def _tokens(text: str) -> int:
+    # The same four-characters-per-token rule of thumb llm_library uses
+    return max(1, math.ceil(len(text) / 4))
+
+
+class StandIn:
+    """
+    Behaviour of the stand-in: fixture selection plus the configured latency,
+    token rate and error distributions. Sampling is seeded for repeatable runs.
+    """
+
+    def __init__(self, fixtures: dict, latency: float = 0.3, latency_dist: str = 'lognormal',
+                 latency_spread: float = 0.5, tokens_per_second: float = 100, rate_jitter: float = 0.2,
+                 image_latency: float = 2.0, image_size: tuple = (768, 1024), error_rate: float = 0.0,
+                 error_mix: dict = None, retry_after: float = 1.0, seed: int = None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_spread = latency_spread
+        self.tokens_per_second = tokens_per_second
+        self.rate_jitter = rate_jitter
+        self.image_latency = image_latency
+        self.image_size = image_size
+        self.error_rate = error_rate
+        self.error_mix = error_mix or {'429': 1.0}
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._images = {}
+
+    def _sample(self, mean: float) -> float:
+        with self._lock:
+            if mean <= 0 or self.latency_dist == 'fixed':
+                return max(0.0, mean)
+            if self.latency_dist == 'uniform':
+                return self._random.uniform(mean * (1 - self.latency_spread), mean * (1 + self.latency_spread))
+            if self.latency_dist == 'exponential':
+                return self._random.expovariate(1 / mean)
+            # lognormal with the given median and sigma
+            return self._random.lognormvariate(math.log(mean), self.latency_spread)
+
+    def first_token_delay(self, image: bool = False) -> float:
+        return self._sample(self.image_latency if image else self.latency)
+
+    def seconds_per_token(self) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        with self._lock:
+            rate = self.tokens_per_second * self._random.uniform(1 - self.rate_jitter, 1 + self.rate_jitter)
+        return 1 / max(rate, 1e-6)
+
+    def pick_error(self):
+        """An error kind from the mix (an HTTP status or 'disconnect'), or None."""
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            kinds, weights = zip(*self.error_mix.items())
+            return self._random.choices(kinds, weights)[0]
+
+    def image(self, prompt: str) -> str:
+        width, height = self.image_size
+        with self._lock:
+            if prompt not in self._images:
+                self._images[prompt] = base64.b64encode(_png(width, height, prompt)).decode('ascii')
+            return self._images[prompt]
+
+    def reply_for(self, prompt: str, response_format: dict = None) -> str:
+        """The canned reply for a prompt, recognised by the agent role it starts with."""
+        name = ((response_format or {}).get('json_schema') or {}).get('name')
+        if name == 'video_script' or 'Script Writer' in prompt:
+            return self.fixtures['script']
+        if name == 'global_themes' or 'analyzing a full video script' in prompt:
+            return self.fixtures['themes']
+        prompts = self.fixtures['frame_prompts']
+        if 'For EACH scene' in prompt:
+            numbers = [int(n) for n in re.findall(r'"scene_number":\s*(\d+)', prompt)] or sorted(prompts)
+            return json.dumps([{'scene_number': n, 'prompt': prompts.get(n) or prompts[min(prompts)]}
+                               for n in numbers], ensure_ascii=False)
+        if 'prompt engineer' in prompt:
+            number = re.search(r"Scene Number:\s*(\d+)", prompt)
+            number = int(number.group(1)) if number else min(prompts)
+            return prompts.get(number) or prompts[min(prompts)]
+        if 'Creative Director' in prompt:
+            return self.fixtures['creative_concept']
+        return self.fixtures['brand_strategy']
+
+
+def _error_response(kind: str, retry_after: float):
+    status = int(kind) if kind.isdigit() else 502
+    response = jsonify({'error': {'message': f"Stand-in {status} error", 'code': status}})
+    response.status_code = status
+    if status == 429:
+        response.headers['Retry-After'] = f"{retry_after:g}"
+    return response
+
+
+def create_app(standin: StandIn) -> Flask:
+    """A Flask app serving the OpenAI chat completions API under /api/v1, like OpenRouter."""
+    app = Flask(__name__)
+
+    @app.route('/api/v1/models')
+    def models():
+        return jsonify({'object': 'list', 'data': []})
+
+    @app.route('/api/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        body = request.get_json(force=True)
+        model = body.get('model', '')
+        messages = body.get('messages') or []
+        max_tokens = body.get('max_tokens')
+        stream = bool(body.get('stream'))
+        prompt_tokens = _tokens(json.dumps(messages))
+
+        error = standin.pick_error()
+        # Only a stream can be cut off halfway; a plain request fails like a dropped upstream instead
+        if error is not None and (error != 'disconnect' or not stream):
+            return _error_response(error, standin.retry_after)
+
+        is_image = 'image' in model
+        if is_image:
+            prompt = _text_of(messages[0]) if messages else ''
+            time.sleep(standin.first_token_delay(image=True))
+            # generate_image_with_style expects the base64 image as the first item of message.content
+            return jsonify(_completion(model, {'role': 'assistant', 'content': [standin.image(prompt)]}, 'stop',
+                                       _usage(prompt_tokens, 1290)))
+
+        # A continuation request carries the partial reply; answer with the rest of the same fixture
+        full = standin.reply_for(_text_of(messages[0]) if messages else '', body.get('response_format'))
+        if len(messages) >= 3 and CONTINUE_MARKER in _text_of(messages[-1]) and messages[-2].get('role') == 'assistant':
+            full = full[len(_text_of(messages[-2])):]
+        text, finish_reason = full, 'stop'
+        if max_tokens and _tokens(full) > max_tokens:
+            text, finish_reason = full[:max_tokens * 4], 'length'
+        usage = _usage(prompt_tokens, _tokens(text))
+
+        if not stream:
+            time.sleep(standin.first_token_delay() + standin.seconds_per_token() * usage['completion_tokens'])
+            return jsonify(_completion(model, {'role': 'assistant', 'content': text}, finish_reason, usage))
+
+        include_usage = bool((body.get('stream_options') or {}).get('include_usage'))
+
+        def generate():
+            completion_id = f"chatcmpl-{uuid4().hex}"
+            per_token = standin.seconds_per_token()
+            time.sleep(standin.first_token_delay())
+            # Stream a few tokens per chunk, paced at the sampled token rate
+            step = 16
+            cut = len(text) // 2 if error == 'disconnect' else None
+            for start in range(0, len(text), step):
+                if cut is not None and start >= cut:
+                    # Raising (rather than returning) aborts the chunked response without its final chunk,
+                    # so the client sees a broken connection instead of a short but clean stream
+                    raise ConnectionAbortedError("Stand-in disconnect")
+                time.sleep(per_token * _tokens(text[start:start + step]))
+                yield _sse_chunk(completion_id, model, {'content': text[start:start + step]}, None)
+            yield _sse_chunk(completion_id, model, {}, finish_reason)
+            if include_usage:
+                yield f"data: {json.dumps(_chunk(completion_id, model, [], usage))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    return app
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
+
+
+def _completion(model: str, message: dict, finish_reason: str, usage: dict) -> dict:
+    return {
+        'id': f"chatcmpl-{uuid4().hex}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+        'usage': usage,
+    }
+
+
+def _chunk(completion_id: str, model: str, choices: list, usage: dict = None) -> dict:
+    return {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+            'model': model, 'choices': choices, 'usage': usage}
+
+
+def _sse_chunk(completion_id: str, model: str, delta: dict, finish_reason) -> str:
+    choice = {'index': 0, 'delta': delta, 'finish_reason': finish_reason}
+    return f"data: {json.dumps(_chunk(completion_id, model, [choice]))}\n\n"
+
+
+def _parse_mix(value: str) -> dict:
+    # "429=0.6,500=0.3,disconnect=0.1"
+    mix = {}
+    for part in filter(None, (p.strip() for p in value.split(','))):
+        kind, _, weight = part.partition('=')
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local OpenAI-compatible stand-in for OpenRouter. Point the app at it with "
+                    "LLM_BASE_URL=http://127.0.0.1:<port>/api/v1.")
+    parser.add_argument("--host", default=os.getenv('STANDIN_HOST', '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('STANDIN_PORT', '8089')))
+    parser.add_argument("--fixtures", default=os.getenv('STANDIN_FIXTURES', FIXTURE_DIR),
+                        help="directory with brand_strategy.md, creative_concept.md, final_script.json, ...")
+    parser.add_argument("--latency", type=float, default=float(os.getenv('STANDIN_LATENCY', '0.3')),
+                        help="median seconds to the first token")
+    parser.add_argument("--latency-dist", choices=('fixed', 'uniform', 'exponential', 'lognormal'),
+                        default=os.getenv('STANDIN_LATENCY_DIST', 'lognormal'))
+    parser.add_argument("--latency-spread", type=float, default=float(os.getenv('STANDIN_LATENCY_SPREAD', '0.5')),
+                        help="lognormal sigma, or the +/- fraction for uniform")
+    parser.add_argument("--tokens-per-second", type=float, default=float(os.getenv('STANDIN_TOKENS_PER_SECOND', '100')),
+                        help="output token rate (0 = instant)")
+    parser.add_argument("--rate-jitter", type=float, default=float(os.getenv('STANDIN_RATE_JITTER', '0.2')),
+                        help="per-request +/- fraction applied to the token rate")
+    parser.add_argument("--image-latency", type=float, default=float(os.getenv('STANDIN_IMAGE_LATENCY', '2.0')),
+                        help="median seconds per image")
+    parser.add_argument("--image-size", default=os.getenv('STANDIN_IMAGE_SIZE', '768x1024'), help="WIDTHxHEIGHT")
+    parser.add_argument("--error-rate", type=float, default=float(os.getenv('STANDIN_ERROR_RATE', '0')),
+                        help="fraction of requests that fail")
+    parser.add_argument("--error-mix", default=os.getenv('STANDIN_ERROR_MIX', '429=0.6,500=0.3,disconnect=0.1'),
+                        help="weighted failure kinds: HTTP statuses or 'disconnect' (stream cut off halfway)")
+    parser.add_argument("--retry-after", type=float, default=float(os.getenv('STANDIN_RETRY_AFTER', '1')),
+                        help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    width, _, height = args.image_size.partition('x')
+    standin = StandIn(
+        load_fixtures(args.fixtures),
+        latency=args.latency, latency_dist=args.latency_dist, latency_spread=args.latency_spread,
+        tokens_per_second=args.tokens_per_second, rate_jitter=args.rate_jitter,
+        image_latency=args.image_latency, image_size=(int(width), int(height or width)),
+        error_rate=args.error_rate, error_mix=_parse_mix(args.error_mix), retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    print(f"Stand-in listening on http://{args.host}:{args.port}/api/v1")
+    create_app(standin).run(host=args.host, port=args.port, threaded=True)
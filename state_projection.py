@@ -0,0 +1,147 @@
+import json
+import math
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from metrics import PROMPT_TOKENS_SAVED
+
+
+class FieldSpec(NamedTuple):
+    """A state field a node reads, in priority order (lower keeps first)."""
+    name: str
+    priority: int
+    max_tokens: Optional[int] = None
+
+
+# Brandfetch payload keys that carry no strategic signal (asset URLs, ids, scores)
+COMPANY_INFO_NOISE = ('id', 'urn', 'claimed', 'qualityScore', 'isNsfw', 'logos', 'images', 'links',
+                      'fonts', 'financialIdentifiers', 'openGraph', 'themeColor')
+
+# Which state fields each prompt-building node needs
+NODE_PROJECTIONS: Dict[str, List[FieldSpec]] = {
+    'brand_strategist': [
+        FieldSpec('company_info', 1),
+    ],
+    'creative_director': [
+        FieldSpec('summary_plan_audience', 1),
+        FieldSpec('br_feedback_result', 2, max_tokens=400),
+        FieldSpec('company_info', 3),
+        # Previous concepts, so regeneration feedback can refer to them
+        FieldSpec('creative_director_node', 4, max_tokens=800),
+    ],
+    'creation_of_scripts': [
+        FieldSpec('summary_plan_audience', 1),
+        FieldSpec('br_feedback_result', 2, max_tokens=400),
+        FieldSpec('company_info', 3, max_tokens=600),
+    ],
+}
+
+# Default token budget for the projected state of each node (PROMPT_TOKEN_BUDGET_<NODE> overrides)
+NODE_TOKEN_BUDGETS = {
+    'brand_strategist': 2000,
+    'creative_director': 2000,
+    'creation_of_scripts': 1200,
+}
+
+TRUNCATION_MARKER = ' …[truncated]'
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English prose and JSON
+    return math.ceil(len(text) / 4)
+
+
+def _compact(value, drop_keys=()):
+    """Removes empty values (and `drop_keys` at any depth) so they cost no tokens."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in drop_keys:
+                continue
+            v = _compact(v, drop_keys)
+            if v not in (None, '', [], {}):
+                out[k] = v
+        return out
+    if isinstance(value, list):
+        return [v for v in (_compact(v, drop_keys) for v in value) if v not in (None, '', [], {})]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _serialize(name: str, value) -> str:
+    if name == 'company_info':
+        value = _compact(value, COMPANY_INFO_NOISE)
+    else:
+        value = _compact(value)
+    if value in (None, '', [], {}):
+        return ''
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(0, max_tokens * 4 - len(TRUNCATION_MARKER))] + TRUNCATION_MARKER
+
+
+def token_budget_for(node: str) -> int:
+    value = os.getenv(f"PROMPT_TOKEN_BUDGET_{node.upper()}")
+    return int(value) if value else NODE_TOKEN_BUDGETS.get(node, 2000)
+
+
+def projection_inputs(node: str, state: dict) -> dict:
+    """The raw state fields `node` reads, e.g. to fingerprint its inputs."""
+    return {spec.name: state.get(spec.name) for spec in NODE_PROJECTIONS[node]}
+
+
+def project_state(node: str, state: dict) -> Tuple[str, dict]:
+    """
+    Renders the state fields `node` needs as compact text within its token budget.
+
+    Fields are added in priority order. A field that would overflow the remaining
+    budget is truncated, and once the budget is spent the remaining fields are
+    dropped.
+
+    Returns:
+        The rendered context and a report with the token counts, including the
+        tokens saved against the full state dict.
+    """
+    budget = token_budget_for(node)
+    remaining = budget
+    sections = []
+    truncated = []
+    dropped = []
+    for spec in sorted(NODE_PROJECTIONS[node], key=lambda s: s.priority):
+        text = _serialize(spec.name, state.get(spec.name))
+        if not text:
+            continue
+        if remaining <= 0:
+            dropped.append(spec.name)
+            continue
+        limit = min(remaining, spec.max_tokens) if spec.max_tokens else remaining
+        fitted = _truncate(text, limit)
+        if fitted is not text:
+            truncated.append(spec.name)
+        section = f"{spec.name}: {fitted}"
+        sections.append(section)
+        remaining -= estimate_tokens(section)
+
+    context = "\n".join(sections)
+    tokens = estimate_tokens(context)
+    baseline = estimate_tokens(str(state))
+    report = {
+        'node': node,
+        'tokens': tokens,
+        'budget': budget,
+        'baseline_tokens': baseline,
+        'tokens_saved': max(0, baseline - tokens),
+        'truncated': truncated,
+        'dropped': dropped,
+    }
+    PROMPT_TOKENS_SAVED.inc(report['tokens_saved'], node=node)
+    if os.getenv('DEBUG_LLM') == '1':
+        print(f"[{node}] projected state: {tokens} tokens (was ~{baseline}, saved ~{report['tokens_saved']})"
+              + (f"; truncated {truncated}" if truncated else "") + (f"; dropped {dropped}" if dropped else ""))
+    return context, report
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional
+
+
+class WorkflowStateStore(ABC):
+    """
+    Server-side storage for per-session workflow state.
+
+    State is stored field by field, so callers can read only the fields they
+    need and write back only the fields they changed. Values must be JSON
+    serialisable.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str, fields: Optional[Iterable[str]] = None) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, session_id: str, values: dict) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_expired(self, max_age: float) -> None:
+        """Drops sessions that have not been written to for `max_age` seconds."""
+        raise NotImplementedError
+
+
+class MemoryStateStore(WorkflowStateStore):
+    """In-process store for development; state is lost on restart and not shared between workers."""
+
+    def __init__(self):
+        self._data = {}
+        self._updated_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, fields: Optional[Iterable[str]] = None) -> dict:
+        with self._lock:
+            stored = self._data.get(session_id, {})
+            if fields is not None:
+                stored = {k: stored[k] for k in fields if k in stored}
+            # Round-trip through JSON so callers never mutate the stored values in place
+            return {k: json.loads(v) for k, v in stored.items()}
+
+    def update(self, session_id: str, values: dict) -> None:
+        encoded = {k: json.dumps(v) for k, v in values.items()}
+        with self._lock:
+            self._data.setdefault(session_id, {}).update(encoded)
+            self._updated_at[session_id] = time.time()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._data.pop(session_id, None)
+            self._updated_at.pop(session_id, None)
+
+    def purge_expired(self, max_age: float) -> None:
+        cutoff = time.time() - max_age
+        with self._lock:
+            for session_id in [s for s, t in self._updated_at.items() if t < cutoff]:
+                self._data.pop(session_id, None)
+                self._updated_at.pop(session_id, None)
+
+
+class SQLiteStateStore(WorkflowStateStore):
+    """Store backed by a local SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workflow_state ("
+                " session_id TEXT NOT NULL,"
+                " field TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (session_id, field))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, session_id: str, fields: Optional[Iterable[str]] = None) -> dict:
+        query = "SELECT field, value FROM workflow_state WHERE session_id = ?"
+        params = [session_id]
+        if fields is not None:
+            fields = list(fields)
+            if not fields:
+                return {}
+            query += f" AND field IN ({', '.join('?' for _ in fields)})"
+            params += fields
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def update(self, session_id: str, values: dict) -> None:
+        now = time.time()
+        rows = [(session_id, k, json.dumps(v), now) for k, v in values.items()]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO workflow_state (session_id, field, value, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM workflow_state WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self, max_age: float) -> None:
+        cutoff = time.time() - max_age
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM workflow_state WHERE session_id IN ("
+                " SELECT session_id FROM workflow_state GROUP BY session_id HAVING MAX(updated_at) < ?)",
+                (cutoff,),
+            )
+
+
+def create_state_store() -> WorkflowStateStore:
+    """Builds the store selected by STATE_STORE ('sqlite', the default, or 'memory')."""
+    backend = os.getenv('STATE_STORE', 'sqlite')
+    if backend == 'memory':
+        return MemoryStateStore()
+    if backend == 'sqlite':
+        return SQLiteStateStore(os.getenv('STATE_STORE_PATH', os.path.join('.cache', 'workflow_state.sqlite')))
+    raise ValueError(f"Unknown STATE_STORE backend: {backend}")
@@ -65,6 +65,10 @@ const appState = {
 };
 
 // --------------- API helper ---------------
+const JOB_POLL_INTERVAL_MS = 1500;
+// Give up on a job that has not finished in this long (the server fails jobs whose worker died)
+const JOB_TIMEOUT_MS = 10 * 60 * 1000;
+
 async function apiPost(path, body) {
   const resp = await fetch(path, {
     method: 'POST',
@@ -75,6 +79,56 @@ async function apiPost(path, body) {
   return await resp.json();
 }
 
+// Streams a POST response as Server-Sent Events, calling onEvent(name, data) for each event
+async function apiStream(path, body, onEvent) {
+  const resp = await fetch(path, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(body || {}),
+  });
+  if (!resp.ok || !resp.body) throw new Error(`Request failed: ${resp.status}`);
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let name = 'message';
+      const dataLines = [];
+      block.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) name = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+      });
+      if (!dataLines.length) continue;
+      const data = JSON.parse(dataLines.join('\n'));
+      // The server reports a failed model request as an 'error' event
+      if (name === 'error') throw new Error(data.message || 'Stream failed');
+      onEvent(name, data);
+    }
+  }
+}
+
+// Starts a background job and polls it until it finishes, calling onProgress(job) on each poll
+async function apiJob(path, body, onProgress) {
+  const accepted = await apiPost(path, { ...(body || {}), async: true });
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  for (;;) {
+    if (Date.now() > deadline) throw new Error('Job timed out');
+    await new Promise((r) => setTimeout(r, JOB_POLL_INTERVAL_MS));
+    const resp = await fetch(accepted.status_url);
+    if (!resp.ok) throw new Error(`Job poll failed: ${resp.status}`);
+    const job = await resp.json();
+    if (job.status === 'succeeded') return job.result;
+    if (job.status === 'failed') throw new Error(job.error || 'Job failed');
+    if (onProgress) onProgress(job);
+  }
+}
+
 // --------------- Brand (Page 1) ---------------
 function decodeHtmlEntities(str) {
   if (!str) return '';
@@ -307,59 +361,83 @@ function renderBrandFromState() {
 
 async function loadAndRenderBrandStrategy() {
   try {
-    const res = await apiPost('/api/brand-strategy', {});
-    const text = (res && res.strategy) || '';
-    const clean = String(text).replace(/\r/g, '');
-    // Split on numbered points (1. 2. 3.)
-    const parts = clean.split(/\n?\s*\d+\.\s*/).filter(Boolean);
-    const [coreRaw, diffRaw, audienceRaw] = [parts[0] || '', parts[1] || '', parts[2] || ''];
-    const stripLabel = (s) => s.replace(/^\s*Brand Core\s*:\s*/i, '')
-                               .replace(/^\s*Brand Positioning \(Key Differentiator\)\s*:\s*/i, '')
-                               .replace(/^\s*Brand Positioning \(Target Audience\)\s*:\s*/i, '')
-                               .trim();
-    const core = stripLabel(coreRaw);
-    const diff = stripLabel(diffRaw);
-    const audience = stripLabel(audienceRaw);
-
-    const missionEl = document.getElementById('brandMission');
-    const diffList = document.getElementById('pointsDifference');
-    const audienceEl = document.getElementById('targetAudience');
-    const promiseEl = document.getElementById('brandPromise');
-
-    if (missionEl && core) missionEl.textContent = core;
-    if (audienceEl && audience) audienceEl.textContent = audience;
-    if (diffList && diff) {
-      diffList.innerHTML = '';
-      const li = document.createElement('li');
-      li.textContent = diff;
-      diffList.appendChild(li);
+    // Stream the strategy so the points fill in while the model is still writing
+    let streamed = '';
+    let text = null;
+    try {
+      await apiStream('/api/brand-strategy/stream', {}, (event, data) => {
+        if (event === 'delta') {
+          streamed += data.text || '';
+          renderBrandStrategyText(streamed, false);
+        } else if (event === 'done') {
+          text = data.strategy || '';
+        }
+      });
+    } catch (e) {
+      console.warn('Streaming brand strategy unavailable, falling back', e);
     }
-
-    // Brand promise: prefer tagline, else differentiator, else core
-    if (promiseEl && !promiseEl.textContent.trim()) {
-      const bp = appState.brand.tagline || diff || core;
-      if (bp) promiseEl.textContent = bp;
-    }
-
-    // If no values yet, derive naive values from core sentence
-    if ((appState.brand.values || []).length === 0 && core) {
-      const tokens = core.split(/[,.;]/).map(t => t.trim()).filter(Boolean).slice(0, 4);
-      appState.brand.values = tokens;
-      const valuesList = document.getElementById('brandValues');
-      if (valuesList) {
-        valuesList.innerHTML = '';
-        appState.brand.values.forEach(v => {
-          const li = document.createElement('li');
-          li.textContent = v;
-          valuesList.appendChild(li);
-        });
-      }
+    if (text === null) {
+      const res = await apiPost('/api/brand-strategy', {});
+      text = (res && res.strategy) || '';
     }
+    renderBrandStrategyText(text, true);
   } catch (e) {
     console.error('Brand strategy load failed', e);
   }
 }
 
+function renderBrandStrategyText(text, complete) {
+  const clean = String(text).replace(/\r/g, '');
+  // Split on numbered points (1. 2. 3.)
+  const parts = clean.split(/\n?\s*\d+\.\s*/).filter(Boolean);
+  const [coreRaw, diffRaw, audienceRaw] = [parts[0] || '', parts[1] || '', parts[2] || ''];
+  const stripLabel = (s) => s.replace(/^\s*Brand Core\s*:\s*/i, '')
+                             .replace(/^\s*Brand Positioning \(Key Differentiator\)\s*:\s*/i, '')
+                             .replace(/^\s*Brand Positioning \(Target Audience\)\s*:\s*/i, '')
+                             .trim();
+  const core = stripLabel(coreRaw);
+  const diff = stripLabel(diffRaw);
+  const audience = stripLabel(audienceRaw);
+
+  const missionEl = document.getElementById('brandMission');
+  const diffList = document.getElementById('pointsDifference');
+  const audienceEl = document.getElementById('targetAudience');
+  const promiseEl = document.getElementById('brandPromise');
+
+  if (missionEl && core) missionEl.textContent = core;
+  if (audienceEl && audience) audienceEl.textContent = audience;
+  if (diffList && diff) {
+    diffList.innerHTML = '';
+    const li = document.createElement('li');
+    li.textContent = diff;
+    diffList.appendChild(li);
+  }
+
+  // The remaining fields are derived once, from the complete strategy
+  if (!complete) return;
+
+  // Brand promise: prefer tagline, else differentiator, else core
+  if (promiseEl && !promiseEl.textContent.trim()) {
+    const bp = appState.brand.tagline || diff || core;
+    if (bp) promiseEl.textContent = bp;
+  }
+
+  // If no values yet, derive naive values from core sentence
+  if ((appState.brand.values || []).length === 0 && core) {
+    const tokens = core.split(/[,.;]/).map(t => t.trim()).filter(Boolean).slice(0, 4);
+    appState.brand.values = tokens;
+    const valuesList = document.getElementById('brandValues');
+    if (valuesList) {
+      valuesList.innerHTML = '';
+      appState.brand.values.forEach(v => {
+        const li = document.createElement('li');
+        li.textContent = v;
+        valuesList.appendChild(li);
+      });
+    }
+  }
+}
+
 // --------------- Creative (Page 2) ---------------
 function parseConceptTextToIdea(text) {
   const titleMatch = text.match(/Idea\s*(\d+)/i);
@@ -409,6 +487,34 @@ function renderIdeasFromState() {
   });
 }
 
+// Resolves once the first concept card is rendered; the rest are appended as their '§' arrives
+function streamConcepts() {
+  return new Promise((resolve, reject) => {
+    let started = false;
+    appState.concepts = [];
+    appState.selectedConceptIndex = 0;
+    selectedIdeaIndex = 0;
+    apiStream('/api/creative-concepts/stream', {}, (event, data) => {
+      if (event === 'concept') {
+        appState.concepts.push(parseConceptTextToIdea(data.content));
+        renderIdeasFromState();
+        if (!started) {
+          started = true;
+          resolve();
+        }
+      } else if (event === 'done' && Array.isArray(data.concepts) && data.concepts.length) {
+        appState.concepts = data.concepts.map((c) => parseConceptTextToIdea(c.content));
+        renderIdeasFromState();
+      }
+    }).then(() => {
+      if (!started) reject(new Error('Concept stream ended without concepts'));
+    }).catch((e) => {
+      if (!started) reject(e);
+      else console.error('Concept stream interrupted', e);
+    });
+  });
+}
+
 function openIdeaModal(index) {
   selectedIdeaIndex = index;
   const idea = appState.concepts[index];
@@ -481,27 +587,94 @@ function renderScriptFromState() {
 }
 
 // --------------- Storyboard (Page 4) ---------------
+// Rendered card width for srcset selection (the grid's columns are at least 180px wide)
+const STORYBOARD_IMAGE_SIZES = '(max-width: 600px) 100vw, 320px';
+const FALLBACK_STORYBOARD_IMAGE = 'https://images.unsplash.com/photo-1523475472560-d2df97ec485c?auto=format&fit=crop&w=1400&q=80';
+
+function buildStoryboardCard(scene, idx) {
+  const card = document.createElement('article');
+  card.className = 'shot-card';
+  card.dataset.index = idx;
+  const time = scene.timestamp || `Scene ${scene.scene_number}`;
+  const description = scene.visual_description || scene.image_prompt || '';
+  const prompt = scene.image_prompt || '';
+  let media;
+  if (scene.pending && !scene.image_url) {
+    // Frame still rendering (streamed storyboard)
+    card.classList.add('pending');
+    media = '<div class="shot-placeholder"></div>';
+  } else {
+    const demoSrc = DEMO_STORYBOARD_IMAGES[idx] || '';
+    // Cards show the compressed variants; the original stays at image_url for export
+    const imageSrc = scene.display_url || scene.image_url || demoSrc || FALLBACK_STORYBOARD_IMAGE;
+    const srcset = scene.image_srcset
+      ? `srcset="${scene.image_srcset}" sizes="${STORYBOARD_IMAGE_SIZES}"`
+      : '';
+    media = `<img src="${imageSrc}" ${srcset} alt="Storyboard shot ${time}" loading="lazy" decoding="async" onerror="this.onerror=null;this.removeAttribute('srcset');this.src='${FALLBACK_STORYBOARD_IMAGE}';" />`;
+  }
+  card.innerHTML = `
+    <figure class="shot-media">
+      ${media}
+    </figure>
+    <div class="shot-info">
+      <span class="shot-time">${time}</span>
+      <p class="shot-description">${description}</p>
+      ${prompt ? `<p class="shot-description"><strong>Prompt for Scene ${scene.scene_number || (idx+1)}:</strong> ${prompt}</p>` : ''}
+    </div>
+  `;
+  return card;
+}
+
 function renderStoryboardFromState() {
   storyboardGrid.innerHTML = '';
   (appState.storyboard || []).forEach((scene, idx) => {
-    const card = document.createElement('article');
-    card.className = 'shot-card';
-    const time = scene.timestamp || `Scene ${scene.scene_number}`;
-    const description = scene.visual_description || scene.image_prompt || '';
-    const prompt = scene.image_prompt || '';
-    const demoSrc = DEMO_STORYBOARD_IMAGES[idx] || '';
-    const imageSrc = scene.image_url || demoSrc || 'https://images.unsplash.com/photo-1523475472560-d2df97ec485c?auto=format&fit=crop&w=1400&q=80';
-    card.innerHTML = `
-      <figure class="shot-media">
-        <img src="${imageSrc}" alt="Storyboard shot ${time}" loading="lazy" onerror="this.onerror=null;this.src='https://images.unsplash.com/photo-1523475472560-d2df97ec485c?auto=format&fit=crop&w=1400&q=80';" />
-      </figure>
-      <div class="shot-info">
-        <span class="shot-time">${time}</span>
-        <p class="shot-description">${description}</p>
-        ${prompt ? `<p class="shot-description"><strong>Prompt for Scene ${scene.scene_number || (idx+1)}:</strong> ${prompt}</p>` : ''}
-      </div>
-    `;
-    storyboardGrid.appendChild(card);
+    storyboardGrid.appendChild(buildStoryboardCard(scene, idx));
+  });
+}
+
+function updateStoryboardCard(idx) {
+  const scene = appState.storyboard[idx];
+  const existing = storyboardGrid.querySelector(`.shot-card[data-index="${idx}"]`);
+  if (!scene || !existing) return;
+  storyboardGrid.replaceChild(buildStoryboardCard(scene, idx), existing);
+}
+
+// Streams the storyboard; resolves as soon as the card skeleton is on screen and keeps
+// filling in prompts and frames as they arrive. Rejects if nothing could be rendered.
+function streamStoryboard() {
+  return new Promise((resolve, reject) => {
+    let started = false;
+    apiStream('/api/generate-storyboard/stream', {}, (event, data) => {
+      if (event === 'themes') {
+        appState.storyboard = (data.storyboard || []).map((s) => ({ ...s, pending: true }));
+        renderStoryboardFromState();
+        started = true;
+        resolve();
+      } else if (event === 'prompt' || event === 'frame') {
+        const scene = appState.storyboard[data.index];
+        if (!scene) return;
+        if (event === 'prompt') scene.image_prompt = data.image_prompt;
+        if (event === 'frame') {
+          scene.image_url = data.image_url;
+          scene.display_url = data.display_url;
+          scene.thumbnail_url = data.thumbnail_url;
+          scene.image_srcset = data.image_srcset;
+          scene.pending = false;
+        }
+        updateStoryboardCard(data.index);
+      } else if (event === 'done') {
+        // An empty storyboard keeps the placeholder cards shown in its place
+        if (Array.isArray(data.storyboard) && data.storyboard.length) {
+          appState.storyboard = data.storyboard;
+          renderStoryboardFromState();
+        }
+      }
+    }).then(() => {
+      if (!started) reject(new Error('Storyboard stream ended early'));
+    }).catch((e) => {
+      if (!started) reject(e);
+      else console.error('Storyboard stream interrupted', e);
+    });
   });
 }
 
@@ -535,7 +708,13 @@ async function preNextFlow(pageIndex) {
       return;
     }
     case 1: {
-      // Load creative concepts from backend
+      // Stream creative concepts; move on as soon as the first card is ready
+      try {
+        await streamConcepts();
+        return;
+      } catch (e) {
+        console.warn('Streaming concepts unavailable, falling back', e);
+      }
       const res = await apiPost('/api/creative-concepts', {});
       const concepts = (res.concepts || []).map((c) => parseConceptTextToIdea(c.content));
       appState.concepts = concepts;
@@ -549,7 +728,14 @@ async function preNextFlow(pageIndex) {
       const current = appState.concepts[selectedIdeaIndex] || appState.concepts[0];
       if (!current) return;
       await apiPost('/api/select-concept', { concept_id: selectedIdeaIndex + 1, content: current.raw });
-      const res = await apiPost('/api/generate-script', {});
+      // Runs as a background job so the request does not hold a server worker
+      const res = await apiJob('/api/generate-script', {}, (job) => {
+        // Scenes arrive one by one as the model finishes each of them
+        if (job.partial && Array.isArray(job.partial.script)) {
+          appState.script = job.partial;
+          renderScriptFromState();
+        }
+      });
       appState.script = res.script || null;
       renderScriptFromState();
       return;
@@ -559,8 +745,18 @@ async function preNextFlow(pageIndex) {
       if (appState.script) {
         await apiPost('/api/update-script', { script: appState.script });
       }
-      const res = await apiPost('/api/generate-storyboard', {});
-      let board = res && Array.isArray(res.storyboard) ? res.storyboard : [];
+      let board;
+      try {
+        // Show cards as soon as themes are ready; frames fill in while the user looks
+        await streamStoryboard();
+        // A stream that completed is the result, even an empty one; only a failed stream is retried
+        if (appState.storyboard.length) return;
+        board = [];
+      } catch (e) {
+        console.warn('Streaming storyboard unavailable, falling back', e);
+        const res = await apiJob('/api/generate-storyboard', {});
+        board = res && Array.isArray(res.storyboard) ? res.storyboard : [];
+      }
       if (!board.length) {
         board = new Array(6).fill(null).map((_, i) => ({
           scene_number: i + 1,
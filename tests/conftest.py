@@ -0,0 +1,62 @@
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+import pytest
+
+# The application modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+STANDIN_PORT = _free_port()
+_CACHE_DIR = tempfile.mkdtemp(prefix='frameagent-tests-')
+
+# Every client talks to the stand-in and every cache lives in a scratch directory. llm_library reads
+# these at import, so they are set before any test module imports it.
+os.environ.update({
+    'LLM_BASE_URL': f"http://127.0.0.1:{STANDIN_PORT}/api/v1",
+    'OPENROUTER_API_KEY': 'test',
+    'LLM_WARMUP': '0',
+    'LLM_CACHE': '0',
+    'IMAGE_CACHE_DIR': os.path.join(_CACHE_DIR, 'images'),
+    'NODE_MEMO_PATH': os.path.join(_CACHE_DIR, 'node_memo.sqlite'),
+    'JOB_STORE_PATH': os.path.join(_CACHE_DIR, 'jobs.sqlite'),
+    'STATE_STORE': 'memory',
+    'STORYBOARD_POSTPROCESS': '0',
+})
+
+
+@pytest.fixture(scope='session')
+def _standin_server():
+    from werkzeug.serving import make_server
+    from standin_server import StandIn, create_app, load_fixtures
+
+    # Request lines from the stand-in would drown out failure reports
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    standin = StandIn(load_fixtures(), latency=0, image_latency=0, tokens_per_second=0, retry_after=0.01, seed=1)
+    server = make_server('127.0.0.1', STANDIN_PORT, create_app(standin), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield standin
+    server.shutdown()
+
+
+@pytest.fixture
+def standin(_standin_server, monkeypatch):
+    """The running stand-in server's behaviour; changes made by a test are undone after it."""
+    for name in ('error_rate', 'error_mix', 'retry_after', 'latency', 'image_latency'):
+        monkeypatch.setattr(_standin_server, name, getattr(_standin_server, name))
+    # Fast retries; each test sets its own limits where it needs them
+    monkeypatch.setenv('LLM_BACKOFF_BASE', '0.01')
+    monkeypatch.setenv('LLM_BACKOFF_MAX', '0.05')
+    return _standin_server
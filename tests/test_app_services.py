@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip('PIL')
+
+
+def _workers(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+
+
+def test_post_processor_workers_do_not_start_services(tmp_path):
+    # The server's main module is imported again in every worker process; only the server may register a job worker
+    script = tmp_path / 'serve.py'
+    script.write_text(textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        import app
+
+        if __name__ == '__main__':
+            from PIL import Image
+            Image.new('RGB', (640, 480), 'red').save({str(tmp_path / 'frame.png')!r})
+            app.start_services()
+            app.start_services()
+            assert app.image_post_processor.process({str(tmp_path / 'frame.png')!r}, 60)
+            app.image_post_processor.shutdown()
+    """))
+    jobs_path = str(tmp_path / 'jobs.sqlite')
+    env = dict(os.environ, JOB_STORE_PATH=jobs_path, STATE_STORE='memory', LLM_WARMUP='0',
+               STORYBOARD_POSTPROCESS='1', STORYBOARD_POSTPROCESS_WORKERS='2')
+    subprocess.run([sys.executable, str(script)], cwd=str(tmp_path), env=env, check=True, timeout=120)
+    assert _workers(jobs_path) == 1
@@ -0,0 +1,91 @@
+import llm_library
+import memo
+from disk_cache import DiskCache
+from image_store import ImageStore
+from memo import NodeMemo
+
+STANDIN = "http://127.0.0.1:8765/api/v1"
+
+
+def _memoized_node(tmp_path, calls):
+    def node(state):
+        calls.append(state["topic"])
+        return {"answer": state["topic"].upper()}
+
+    node_memo = NodeMemo(DiskCache(str(tmp_path / "memo.sqlite")))
+    return node_memo, node_memo.wrap("node", node, lambda state: {"topic": state["topic"]})
+
+
+def test_memo_reuses_results_for_unchanged_inputs(tmp_path):
+    calls = []
+    node_memo, node = _memoized_node(tmp_path, calls)
+    assert node({"topic": "a"}) == {"answer": "A"}
+    assert node({"topic": "a"}) == {"answer": "A"}
+    assert node({"topic": "b"}) == {"answer": "B"}
+    assert calls == ["a", "b"]
+    assert node_memo.reused == ["node"]
+
+
+def test_memo_does_not_store_degraded_results(tmp_path):
+    calls = []
+
+    def node(state):
+        calls.append(state)
+        return {"script": []}
+
+    node_memo = NodeMemo(DiskCache(str(tmp_path / "memo.sqlite")))
+    wrapped = node_memo.wrap("node", node, lambda state: {}, degraded=lambda result: not result["script"])
+    wrapped({})
+    wrapped({})
+    assert len(calls) == 2
+
+
+def test_memo_key_depends_on_backend(tmp_path, monkeypatch):
+    calls = []
+    _, node = _memoized_node(tmp_path, calls)
+    node({"topic": "a"})
+    monkeypatch.setattr(memo, "OPENROUTER_BASE_URL", STANDIN)
+    node({"topic": "a"})
+    assert calls == ["a", "a"]
+
+
+def test_memo_key_depends_on_code_constants(tmp_path):
+    cache = DiskCache(str(tmp_path / "memo.sqlite"))
+    calls = []
+
+    def node(state):
+        calls.append(state)
+        return {}
+
+    NodeMemo(cache).wrap("node", node, lambda state: {}, code=("prompt v1",))({})
+    NodeMemo(cache).wrap("node", node, lambda state: {}, code=("prompt v2",))({})
+    assert len(calls) == 2
+
+
+def test_completion_key_depends_on_backend(monkeypatch):
+    messages = [{"role": "user", "content": "hi"}]
+    key = llm_library.completion_cache_key("m", messages, temperature=0)
+    assert key == llm_library.completion_cache_key("m", messages, temperature=0)
+    assert key != llm_library.completion_cache_key("m", messages, temperature=1)
+    monkeypatch.setattr(llm_library, "OPENROUTER_BASE_URL", STANDIN)
+    assert key != llm_library.completion_cache_key("m", messages, temperature=0)
+
+
+def test_image_key_depends_on_every_part():
+    key = ImageStore.key_for("https://openrouter.ai/api/v1", "model", "a cat", "noir")
+    assert key != ImageStore.key_for(STANDIN, "model", "a cat", "noir")
+    assert key != ImageStore.key_for("https://openrouter.ai/api/v1", "other", "a cat", "noir")
+    # Parts are delimited, so moving text between them changes the key
+    assert key != ImageStore.key_for("https://openrouter.ai/api/v1", "model", "a ca", "tnoir")
+
+
+def test_image_store_links_stored_images(tmp_path):
+    store = ImageStore(str(tmp_path / "store"))
+    key = ImageStore.key_for(STANDIN, "model", "a cat", "noir")
+    dest = str(tmp_path / "frame.png")
+    assert not store.link(key, dest)
+    store.put(key, b"png")
+    assert store.link(key, dest)
+    with open(dest, "rb") as f:
+        assert f.read() == b"png"
+    assert store.get(key) == b"png"
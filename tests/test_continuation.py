@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import llm_library
+from llm_library import LLMError, LLMServerError, chat_json, chat_with_openrouter, max_tokens_for
+from main import SCRIPT_SCHEMA
+from metrics import node_context
+
+SCRIPT_PROMPT = "You are the Script Writer AI Agent. Write the script."
+
+
+@pytest.fixture
+def short_budget(standin, monkeypatch):
+    """Replies are cut off every 100 tokens (400 characters) and continued."""
+    monkeypatch.setenv("LLM_MAX_TOKENS_CONTINUATION_TEST", "100")
+    monkeypatch.setenv("LLM_MAX_CONTINUATIONS", "10")
+    return standin
+
+
+def test_truncated_reply_is_continued(short_budget):
+    expected = short_budget.fixtures["script"]
+    assert len(expected) > 3 * 400
+    with node_context("continuation_test"):
+        assert chat_with_openrouter(SCRIPT_PROMPT, bypass_cache=True) == expected
+
+
+def test_truncated_stream_is_continued(short_budget):
+    with node_context("continuation_test"):
+        text = "".join(chat_with_openrouter(SCRIPT_PROMPT, bypass_cache=True, stream=True))
+    assert text == short_budget.fixtures["script"]
+
+
+def test_truncated_structured_reply_parses_completely(short_budget):
+    with node_context("continuation_test"):
+        value = chat_json(SCRIPT_PROMPT, SCRIPT_SCHEMA, "video_script", bypass_cache=True)
+    assert value == json.loads(short_budget.fixtures["script"])
+
+
+def test_continuations_are_bounded(short_budget, monkeypatch):
+    monkeypatch.setenv("LLM_MAX_CONTINUATIONS", "1")
+    with node_context("continuation_test"):
+        text = chat_with_openrouter(SCRIPT_PROMPT, bypass_cache=True)
+    assert text == short_budget.fixtures["script"][:2 * 400]
+
+
+def test_disconnected_stream_raises(standin, monkeypatch):
+    monkeypatch.setattr(standin, "pick_error", lambda: "disconnect")
+    with pytest.raises(LLMError):
+        "".join(chat_with_openrouter(SCRIPT_PROMPT, bypass_cache=True, stream=True))
+
+
+def test_max_tokens_adapts_but_never_drops_below_the_default(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_TOKENS", "1024")
+    monkeypatch.setenv("LLM_MAX_TOKENS_CAP", "4096")
+    for _ in range(3):
+        llm_library._record_output_size("short_node", 50)
+        llm_library._record_output_size("long_node", 3000)
+        llm_library._record_output_size("huge_node", 9000)
+    assert max_tokens_for("short_node") == 1024
+    assert max_tokens_for("long_node") == 3840
+    assert max_tokens_for("huge_node") == 4096
+    assert max_tokens_for("new_node") == 1024
+
+
+def _chunk(content=None, finish_reason=None):
+    choice = SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice], usage=None)
+
+
+class _CutOffClient:
+    """Streams one reply that stops without a finish_reason."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        return iter([_chunk("partial answer")])
+
+
+def test_stream_without_finish_reason_is_an_error(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+    client = _CutOffClient()
+    stream = llm_library._stream_completion(client, [{"role": "user", "content": "hi"}], "key", "cut_off_node")
+    with pytest.raises(LLMServerError):
+        list(stream)
+    assert "cut_off_node" not in llm_library._OUTPUT_SIZES
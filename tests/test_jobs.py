@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobStore
+
+
+def _wait(store, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job['status'] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_result_progress_and_partial(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    queue = JobQueue(store, workers=1)
+
+    def work(job, n):
+        job.report({'stage': 'half'}, [1])
+        return {'n': n}
+
+    job = _wait(store, queue.submit('test', work, 3, session_id='s'))
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == {'n': 3}
+    assert job['progress'] == {'stage': 'half'}
+    assert job['partial'] == [1]
+    assert job['session_id'] == 's'
+
+
+def test_failed_job_records_its_error(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    queue = JobQueue(store, workers=1)
+
+    def work(job):
+        raise ValueError('bad input')
+
+    job = _wait(store, queue.submit('test', work))
+    assert job['status'] == FAILED
+    assert job['error'] == 'bad input'
+
+
+def test_jobs_of_a_dead_worker_are_failed_on_start(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    store.heartbeat('dead')
+    running = store.create('test', owner='dead')
+    store.update(running, status=RUNNING)
+    unowned = store.create('test')
+    time.sleep(0.2)
+
+    JobQueue(store, workers=1, stale_after=0.1)
+    for job_id in (running, unowned):
+        job = store.get(job_id)
+        assert job['status'] == FAILED
+        assert 'restart' in job['error']
+
+
+def test_jobs_of_a_live_worker_are_kept(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    store.heartbeat('alive')
+    job_id = store.create('test', owner='alive')
+    assert store.fail_orphaned(30) == 0
+    assert store.get(job_id)['status'] == QUEUED
+
+
+def test_a_running_queue_fails_orphans_and_keeps_its_own_jobs(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    queue = JobQueue(store, workers=1, heartbeat_interval=0.05, stale_after=0.3)
+    release = threading.Event()
+    own = queue.submit('test', lambda job: release.wait(5) and 'done')
+
+    # A worker that stops beating while its job is running
+    store.heartbeat('crashed')
+    orphan = store.create('test', owner='crashed')
+    time.sleep(0.8)
+    assert store.get(orphan)['status'] == FAILED
+    release.set()
+    assert _wait(store, own)['status'] == SUCCEEDED
+
+
+def test_each_queue_registers_one_worker(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite')
+    JobQueue(JobStore(path), workers=1)
+    JobQueue(JobStore(path), workers=1)
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0] == 2
+
+
+def test_stores_from_before_job_owners_are_migrated(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite')
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, session_id TEXT, status TEXT NOT NULL,"
+            " progress TEXT, partial TEXT, result TEXT, error TEXT, created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)")
+        conn.execute("INSERT INTO jobs VALUES ('old', 'test', NULL, 'running', NULL, NULL, NULL, NULL, 0, 0)")
+    store = JobStore(path)
+    JobQueue(store, workers=1)
+    assert store.get('old')['status'] == FAILED
@@ -0,0 +1,132 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+import llm_library
+from llm_library import LLMError, LLMRateLimitError, LLMTimeoutError, _create_with_retries, get_client
+from rate_limiter import AdaptiveConcurrency, RateLimiter, TokenBucket, backoff_delay, parse_retry_after
+
+MESSAGES = [{"role": "user", "content": "You are the Brand Strategist AI Agent."}]
+
+
+def test_token_bucket_waits_once_its_capacity_is_spent():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(3) == pytest.approx(3, abs=0.1)
+
+
+def test_token_bucket_caps_oversized_requests_at_a_full_bucket():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.reserve(600) == 0
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.1)
+
+
+def test_token_bucket_adjust_returns_unused_tokens():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.reserve(60)
+    bucket.adjust(30)
+    assert bucket.reserve(30) == 0
+
+
+def test_concurrency_grows_additively():
+    concurrency = AdaptiveConcurrency(initial=4, maximum=8)
+    for _ in range(4):
+        concurrency.on_success()
+    assert concurrency.limit == pytest.approx(5, abs=0.1)
+
+
+def test_concurrency_halves_on_throttle_once_per_cooldown():
+    concurrency = AdaptiveConcurrency(initial=8, minimum=2, cooldown=60)
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 4
+    concurrency._last_decrease = 0
+    concurrency.on_throttle()
+    concurrency._last_decrease = 0
+    concurrency.on_throttle()
+    assert concurrency.limit == 2
+
+
+def test_concurrency_limit_is_enforced():
+    concurrency = AdaptiveConcurrency(initial=2)
+    assert concurrency.try_acquire() and concurrency.try_acquire()
+    assert not concurrency.try_acquire()
+    concurrency.release()
+    assert concurrency.try_acquire()
+
+
+def test_slot_holds_a_concurrency_permit():
+    limiter = RateLimiter(concurrency=1)
+    with limiter.slot(10):
+        assert limiter.concurrency.in_flight == 1
+        assert not limiter.concurrency.try_acquire()
+    assert limiter.concurrency.in_flight == 0
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after": "3"}, 3),
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({}, None),
+    (None, None),
+])
+def test_parse_retry_after(headers, expected):
+    assert parse_retry_after(headers) == expected
+
+
+def test_parse_retry_after_http_date():
+    headers = {"retry-after": formatdate(time.time() + 10, usegmt=True)}
+    assert parse_retry_after(headers) == pytest.approx(10, abs=1.1)
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    for attempt in range(8):
+        assert 0 <= backoff_delay(attempt, base=1, cap=5) <= min(5, 2 ** attempt)
+    assert 2 <= backoff_delay(3, base=1, cap=5, retry_after=2) <= 2.5
+
+
+def _count_requests(standin, monkeypatch, errors):
+    """Makes the stand-in fail with `errors` in turn (None succeeds) and counts the requests it receives."""
+    calls = []
+
+    def pick_error():
+        calls.append(1)
+        return errors[len(calls) - 1] if len(calls) <= len(errors) else None
+
+    monkeypatch.setattr(standin, "pick_error", pick_error)
+    return calls
+
+
+def test_transient_failures_are_retried(standin, monkeypatch):
+    calls = _count_requests(standin, monkeypatch, ["500", "429"])
+    completion = _create_with_retries(get_client(), llm_library.TEXT_MODEL, "test", messages=MESSAGES, max_tokens=64)
+    assert completion.choices[0].message.content
+    assert len(calls) == 3
+
+
+def test_retries_stop_after_max_retries(standin, monkeypatch):
+    monkeypatch.setenv("LLM_MAX_RETRIES", "2")
+    calls = _count_requests(standin, monkeypatch, ["429"] * 10)
+    with pytest.raises(LLMRateLimitError):
+        _create_with_retries(get_client(), llm_library.TEXT_MODEL, "test", messages=MESSAGES, max_tokens=64)
+    assert len(calls) == 3
+
+
+def test_client_errors_are_not_retried(standin, monkeypatch):
+    calls = _count_requests(standin, monkeypatch, ["400"])
+    with pytest.raises(LLMError) as raised:
+        _create_with_retries(get_client(), llm_library.TEXT_MODEL, "test", messages=MESSAGES, max_tokens=64)
+    assert raised.value.status == 400
+    assert len(calls) == 1
+
+
+def test_no_retry_starts_past_the_deadline(standin, monkeypatch):
+    # The server asks for a longer wait than the deadline leaves
+    monkeypatch.setattr(standin, "retry_after", 1.0)
+    calls = _count_requests(standin, monkeypatch, ["429"] * 10)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        _create_with_retries(get_client(), llm_library.TEXT_MODEL, "test", deadline=time.monotonic() + 0.5,
+                             messages=MESSAGES, max_tokens=64)
+    assert len(calls) == 1
+    assert time.monotonic() - started < 0.5
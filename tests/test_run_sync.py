@@ -0,0 +1,56 @@
+import asyncio
+import contextvars
+
+import pytest
+
+import llm_library
+from llm_library import run_sync
+
+label = contextvars.ContextVar('label', default='')
+
+
+async def _loop_and_label():
+    await asyncio.sleep(0)
+    return asyncio.get_running_loop(), label.get()
+
+
+def test_runs_every_call_on_one_long_lived_loop():
+    first, _ = run_sync(_loop_and_label())
+    second, _ = run_sync(_loop_and_label())
+    assert first is second
+    assert first.is_running()
+
+
+def test_async_clients_survive_across_calls(monkeypatch):
+    monkeypatch.setattr(llm_library, "_get_api_key", lambda: "test-key")
+
+    async def client():
+        return llm_library.get_async_client(llm_library.TEXT_MODEL)
+
+    first = run_sync(client())
+    assert run_sync(client()) is first
+    assert not first.is_closed()
+
+
+def test_carries_context_variables():
+    token = label.set('frame_prompts')
+    try:
+        assert run_sync(_loop_and_label())[1] == 'frame_prompts'
+    finally:
+        label.reset(token)
+
+
+def test_works_from_a_running_loop():
+    async def caller():
+        return run_sync(_loop_and_label())
+
+    loop, _ = asyncio.run(caller())
+    assert loop is llm_library._background_loop()
+
+
+def test_propagates_exceptions():
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        run_sync(fail())
@@ -0,0 +1,51 @@
+from llm_library import LLMServerError
+from main import DEGRADED_RESULTS
+from speculation import SpeculativeExecutor
+
+SCRIPT_DEGRADED = DEGRADED_RESULTS["creation_of_scripts"]
+
+
+def _executor(**kwargs):
+    return SpeculativeExecutor(enabled=True, workers=2, **kwargs)
+
+
+def test_matching_run_is_a_hit():
+    executor = _executor()
+    executor.start("s", "creation_of_scripts", "k", lambda: {"scripts_created": {"script": [{"scene_number": 1}]}})
+    result = executor.take("s", "creation_of_scripts", "k", timeout=5, degraded=SCRIPT_DEGRADED)
+    assert result == {"scripts_created": {"script": [{"scene_number": 1}]}}
+
+
+def test_changed_inputs_are_a_miss():
+    executor = _executor()
+    executor.start("s", "node", "old", lambda: {"value": 1})
+    assert executor.take("s", "node", "new", timeout=5) is None
+
+
+def test_degraded_result_is_a_miss():
+    executor = _executor()
+    executor.start("s", "creation_of_scripts", "k", lambda: {"scripts_created": {"script": []}})
+    assert executor.take("s", "creation_of_scripts", "k", timeout=5, degraded=SCRIPT_DEGRADED) is None
+
+
+def test_empty_result_is_a_miss():
+    executor = _executor()
+    executor.start("s", "node", "k", lambda: {})
+    assert executor.take("s", "node", "k", timeout=5) is None
+
+
+def test_failed_run_is_a_miss():
+    def fail():
+        raise LLMServerError("boom")
+
+    executor = _executor()
+    executor.start("s", "node", "k", fail)
+    assert executor.take("s", "node", "k", timeout=5) is None
+
+
+def test_runs_are_capped_per_session():
+    executor = _executor(max_calls=1)
+    assert executor.start("s", "node", "a", lambda: {"value": 1})
+    assert not executor.start("s", "node", "b", lambda: {"value": 2})
+    executor.discard("s")
+    assert executor.start("s", "node", "b", lambda: {"value": 2})
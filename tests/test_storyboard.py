@@ -0,0 +1,109 @@
+import copy
+import hashlib
+import json
+from collections import Counter
+
+import pytest
+
+import app
+import llm_library
+from image_store import ImageStore
+
+
+@pytest.fixture
+def requests_made(standin, monkeypatch, tmp_path):
+    """Counts the stand-in's theme, frame prompt and image requests; frames are written under tmp_path."""
+    counts = Counter()
+    reply_for, image = standin.reply_for, standin.image
+
+    def counting_reply(prompt, response_format=None):
+        if 'analyzing a full video script' in prompt:
+            counts['themes'] += 1
+        elif 'prompt engineer' in prompt:
+            counts['prompts'] += 1
+            # The canned prompt only depends on the scene number; tie it to the scene's content like a model would
+            return f"{reply_for(prompt, response_format)} ({hashlib.sha256(prompt.encode()).hexdigest()[:8]})"
+        return reply_for(prompt, response_format)
+
+    def counting_image(prompt):
+        counts['images'] += 1
+        return image(prompt)
+
+    monkeypatch.setattr(standin, 'reply_for', counting_reply)
+    monkeypatch.setattr(standin, 'image', counting_image)
+    monkeypatch.setattr(app, 'FRAME_PROMPT_MODE', 'per_scene')
+    monkeypatch.setattr(llm_library, '_IMAGE_STORE', ImageStore(str(tmp_path / 'image_store')))
+    monkeypatch.chdir(tmp_path)
+    return counts
+
+
+def _run(state):
+    events = list(app._iter_storyboard_events(state, 'session'))
+    return events, dict(events[-1][1]) if events[-1][0] == 'done' else None
+
+
+def _script(standin):
+    return json.loads(standin.fixtures['script'])
+
+
+def test_first_run_renders_every_frame(standin, requests_made):
+    scenes = _script(standin)['script']
+    events, done = _run({'scripts_created': _script(standin)})
+    kinds = Counter(kind for kind, _ in events)
+    assert kinds == {'themes': 1, 'prompt': len(scenes), 'frame': len(scenes), 'done': 1}
+    assert all(entry['image_url'] for entry in done['storyboard'])
+    assert requests_made == {'themes': 1, 'prompts': len(scenes), 'images': len(scenes)}
+
+
+def test_editing_one_scene_rerenders_only_that_frame(standin, requests_made):
+    state = {'scripts_created': _script(standin)}
+    _run(state)
+    requests_made.clear()
+
+    edited = copy.deepcopy(state)
+    edited['scripts_created']['script'][2]['visual_description'] += ' Extra detail.'
+    events, _ = _run(edited)
+    assert requests_made == {'prompts': 1, 'images': 1}
+    themes = [data for kind, data in events if kind == 'themes'][0]
+    assert themes['reused']
+    reused = {data['index']: data['reused'] for kind, data in events if kind == 'prompt'}
+    assert [index for index, was_reused in reused.items() if not was_reused] == [2]
+
+
+def test_whitespace_and_case_edits_reuse_every_frame(standin, requests_made):
+    state = {'scripts_created': _script(standin)}
+    _run(state)
+    requests_made.clear()
+
+    edited = copy.deepcopy(state)
+    scene = edited['scripts_created']['script'][0]
+    scene['setting'] = '  ' + scene['setting'].upper() + ' '
+    scene['text_on_screen'] = 'New caption'
+    _run(edited)
+    assert requests_made == {}
+
+
+def test_rewriting_most_scenes_refreshes_the_themes(standin, requests_made):
+    state = {'scripts_created': _script(standin)}
+    _run(state)
+    requests_made.clear()
+
+    edited = copy.deepcopy(state)
+    scenes = edited['scripts_created']['script']
+    for scene in scenes:
+        scene['visual_description'] = 'A different shot of ' + scene['visual_description']
+    _run(edited)
+    assert requests_made == {'themes': 1, 'prompts': len(scenes), 'images': len(scenes)}
+
+
+def test_fallback_themes_are_not_kept(standin, requests_made, monkeypatch):
+    monkeypatch.setattr(standin, 'error_rate', 1.0)
+    monkeypatch.setattr(standin, 'error_mix', {'400': 1.0})
+    state = {'scripts_created': _script(standin)}
+    _run(state)
+    assert state['storyboard_fingerprints']['scenes'] == []
+
+    monkeypatch.setattr(standin, 'error_rate', 0.0)
+    requests_made.clear()
+    _run(state)
+    assert requests_made['themes'] == 1
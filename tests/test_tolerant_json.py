@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from tolerant_json import IncrementalJSONParser, parse_json_lenient
+
+SCRIPT = {"script": [{"scene_number": i, "setting": f"Room {i} [lit]", "note": "a \"quoted\" {brace}"}
+                     for i in range(1, 5)]}
+
+
+def test_complete_value():
+    assert parse_json_lenient('{"a": [1, 2]}') == ({"a": [1, 2]}, True)
+
+
+def test_code_fenced_payload():
+    text = "Here is the script:\n```json\n" + json.dumps(SCRIPT, indent=2) + "\n```\nLet me know!"
+    assert parse_json_lenient(text, dict) == (SCRIPT, True)
+
+
+def test_bracketed_preamble_is_skipped():
+    assert parse_json_lenient('prefix [note] then {"a":1}') == ({"a": 1}, True)
+    assert parse_json_lenient('prefix [note] then {"a":1}', dict) == ({"a": 1}, True)
+
+
+def test_expected_type_is_preferred():
+    assert parse_json_lenient('Scenes [1, 2] follow: {"script": []}', dict) == ({"script": []}, True)
+    assert parse_json_lenient('Use {name} here: [1, 2]', list) == ([1, 2], True)
+
+
+def test_falls_back_to_first_recoverable_value():
+    assert parse_json_lenient('[1, 2]', dict) == ([1, 2], True)
+    assert parse_json_lenient('{}') == ({}, True)
+
+
+def test_truncated_value_is_repaired():
+    value, complete = parse_json_lenient('{"script": [{"a": 1}, {"b": "unfinished')
+    assert not complete
+    assert value == {"script": [{"a": 1}, {}]}
+
+
+def test_truncation_drops_incomplete_keys_and_numbers():
+    assert parse_json_lenient('{"a": 1, "b": 2') == ({"a": 1}, False)
+    assert parse_json_lenient('{"a": 1, "b') == ({"a": 1}, False)
+
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        parse_json_lenient("no json here")
+    with pytest.raises(ValueError):
+        parse_json_lenient("")
+
+
+def _stream(parser, text, size):
+    emitted = []
+    for i in range(0, len(text), size):
+        emitted.extend(parser.feed(text[i:i + size]))
+    return emitted
+
+
+@pytest.mark.parametrize("size", [1, 7, 12, 1000])
+def test_incremental_parser_emits_each_element_once(size):
+    text = "Sure! [draft]\n```json\n" + json.dumps(SCRIPT) + "\n```"
+    parser = IncrementalJSONParser(key="script")
+    emitted = _stream(parser, text, size)
+    emitted.extend(parser.close())
+    assert emitted == SCRIPT["script"]
+
+
+def test_incremental_parser_emits_elements_before_the_document_ends():
+    text = json.dumps(SCRIPT)
+    parser = IncrementalJSONParser(key="script")
+    second_scene_end = text.index('{"scene_number": 3')
+    assert parser.feed(text[:second_scene_end]) == SCRIPT["script"][:2]
+
+
+def test_incremental_parser_returns_partial_last_element_on_close():
+    text = json.dumps(SCRIPT)
+    cut = text.index('"note"', text.index('"scene_number": 4'))
+    parser = IncrementalJSONParser(key="script")
+    emitted = parser.feed(text[:cut])
+    assert emitted == SCRIPT["script"][:3]
+    assert parser.close() == [{"scene_number": 4, "setting": "Room 4 [lit]"}]
+
+
+def test_incremental_parser_top_level_array():
+    parser = IncrementalJSONParser()
+    emitted = _stream(parser, 'Prompts: [{"a": 1}, "two", 3]', 4)
+    emitted.extend(parser.close())
+    assert emitted == [{"a": 1}, "two", 3]
+
+
+def test_incremental_parser_skips_braced_preamble_and_nested_keys():
+    parser = IncrementalJSONParser(key="script")
+    text = 'Use {name}: {"other": {"script": [0]}, "script": [1, {"a": [2]}, "s"], "after": [9]}'
+    assert _stream(parser, text, 5) == [1, {"a": [2]}, "s"]
+    assert parser.close() == []
+
+
+def test_incremental_parser_drops_malformed_elements():
+    parser = IncrementalJSONParser(key="script")
+    assert parser.feed('{"script": [{"a": 1}, {oops}, {"c": 3}]}') == [{"a": 1}, {"c": 3}]
+
+
+def test_script_node_streams_scenes_from_the_standin(standin):
+    from main import creation_of_scripts_node
+
+    # The stand-in streams its reply 16 characters at a time
+    streamed = []
+    result = creation_of_scripts_node({'selected_concept': 'Idea 1'}, on_scene=streamed.append)
+    expected = json.loads(standin.fixtures['script'])['script']
+    assert streamed == expected
+    assert result == {'scripts_created': {'script': expected}}
@@ -0,0 +1,288 @@
+import json
+from typing import Any, Iterator, List, Optional, Tuple
+
+
+_DECODER = json.JSONDecoder()
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def _json_starts(text: str) -> Iterator[int]:
+    """Indexes of every '{' and '[' in order: the candidate starts of the JSON value."""
+    for i, ch in enumerate(text):
+        if ch in _CLOSERS:
+            yield i
+
+
+def _complete_prefix(text: str, start: int) -> Optional[str]:
+    """
+    The longest prefix of text[start:] that is valid JSON once its open strings
+    and containers are closed, with the closers appended. Incomplete trailing
+    keys, values and commas are dropped. Returns None if nothing is recoverable.
+    """
+    # Each stack entry is [bracket, state]; state is what the container expects next:
+    # 'key', 'colon', 'value' or 'comma'
+    stack: List[list] = []
+    safe: Optional[Tuple[int, str]] = None
+    i = start
+    n = len(text)
+
+    def mark(end: int) -> None:
+        nonlocal safe
+        safe = (end, ''.join(_CLOSERS[entry[0]] for entry in reversed(stack)))
+
+    def value_done(end: int) -> None:
+        if stack:
+            stack[-1][1] = 'comma'
+        mark(end)
+
+    while i < n:
+        ch = text[i]
+        if ch in ' \t\r\n':
+            i += 1
+            continue
+        state = stack[-1][1] if stack else 'value'
+        if ch == '"':
+            # Scan to the closing quote, honouring escapes
+            j = i + 1
+            while j < n and text[j] != '"':
+                j += 2 if text[j] == '\\' else 1
+            if j >= n:
+                break
+            if stack and stack[-1][0] == '{' and state == 'key':
+                stack[-1][1] = 'colon'
+            else:
+                value_done(j + 1)
+            i = j + 1
+        elif ch in '{[':
+            stack.append([ch, 'key' if ch == '{' else 'value'])
+            mark(i + 1)
+            i += 1
+        elif ch in '}]':
+            if not stack or _CLOSERS[stack[-1][0]] != ch:
+                break
+            stack.pop()
+            value_done(i + 1)
+            i += 1
+            if not stack:
+                return text[start:i]
+        elif ch == ':':
+            if stack:
+                stack[-1][1] = 'value'
+            i += 1
+        elif ch == ',':
+            if stack:
+                stack[-1][1] = 'key' if stack[-1][0] == '{' else 'value'
+            i += 1
+        else:
+            # Number or literal: complete only once a delimiter follows it
+            j = i
+            while j < n and text[j] not in ' \t\r\n,]}':
+                j += 1
+            if j >= n:
+                break
+            try:
+                json.loads(text[i:j])
+            except ValueError:
+                break
+            value_done(j)
+            i = j
+    if safe is None:
+        return None
+    end, closers = safe
+    return text[start:end] + closers
+
+
+def _parse_from(text: str, start: int) -> Optional[Tuple[Any, bool]]:
+    """The JSON value starting at text[start] and whether it was complete, or None if nothing is recoverable."""
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+        return value, True
+    except ValueError:
+        pass
+    repaired = _complete_prefix(text, start)
+    if repaired is None:
+        return None
+    try:
+        return json.loads(repaired), False
+    except ValueError:
+        return None
+
+
+def parse_json_lenient(text: str, expected: Optional[type] = None) -> Tuple[Any, bool]:
+    """
+    Parses the first JSON value in model output, tolerating code fences, text
+    around the value and truncation.
+
+    A bracket in a preamble ("[note]", "{name}") does not win: candidates that
+    recover nothing, only an empty container, or not the `expected` type (dict
+    or list) are skipped for the next '{' or '['. If no candidate qualifies,
+    the first value that could be recovered at all is returned.
+
+    Returns:
+        The parsed value and whether it was complete (False when it had to be
+        repaired from a truncated prefix).
+
+    Raises:
+        ValueError: no JSON value could be recovered.
+    """
+    text = text or ''
+    first = None
+    found = False
+    for start in _json_starts(text):
+        found = True
+        parsed = _parse_from(text, start)
+        if parsed is None:
+            continue
+        value = parsed[0]
+        if value and (expected is None or isinstance(value, expected)):
+            return parsed
+        if first is None:
+            first = parsed
+    if not found:
+        raise ValueError("No JSON object or array found in the response")
+    if first is None:
+        raise ValueError("Could not recover JSON from the response")
+    return first
+
+
+class IncrementalJSONParser:
+    """
+    Parses model output as it streams in, reporting each element of the array
+    under `key` (or of a top-level array) once that element is complete.
+
+    The text is scanned once: bracket depth, string and escape state and the
+    start of the current element are kept between `feed` calls, and each
+    element is decoded on its own when the ',' or ']' after it arrives.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self.key = key
+        # The array sits under `key` in an object, or is the top-level value
+        self._expected = dict if key is not None else list
+        self._root = '{' if key is not None else '['
+        self.text = ''
+        self.emitted = 0
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # What the top-level object expects next ('key', 'colon', 'value' or 'comma') and its last key
+        self._root_state = 'key'
+        self._root_key = None
+        # Depth of the target array once it has opened, and where its current element starts
+        self._target = None
+        self._element_start = None
+        self._done = False
+
+    def _scan(self) -> list:
+        items = []
+        text = self.text
+        i = self._pos
+        n = len(text)
+        while i < n and not self._done:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._string_done(text, i)
+                i += 1
+                continue
+            if not self._stack:
+                # Outside the value: skip preambles and fences until the expected root opens
+                if ch == self._root:
+                    self._stack.append(ch)
+                    self._root_state = 'key'
+                    self._root_key = None
+                    if self.key is None:
+                        self._target = 1
+                i += 1
+                continue
+            depth = len(self._stack)
+            if depth == self._target:
+                if ch in ',]':
+                    items.extend(self._element(text, i))
+                elif self._element_start is None and ch not in ' \t\r\n':
+                    self._element_start = i
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in '{[':
+                if (depth == 1 and self.key is not None and ch == '[' and self._root_state == 'value'
+                        and self._root_key == self.key and self._target is None):
+                    self._target = 2
+                self._stack.append(ch)
+            elif ch in '}]':
+                self._stack.pop()
+                if depth == self._target:
+                    # The target array closed; nothing after it is reported
+                    self._done = True
+                elif not self._stack:
+                    # A bracketed preamble: look for the next root
+                    self._target = None
+                elif len(self._stack) == 1:
+                    self._root_state = 'comma'
+            elif depth == 1 and self._stack[0] == '{':
+                if ch == ':':
+                    self._root_state = 'value'
+                elif ch == ',':
+                    self._root_state = 'key'
+            i += 1
+        self._pos = i
+        return items
+
+    def _string_done(self, text: str, end: int) -> None:
+        if len(self._stack) == 1 and self._stack[0] == '{' and self._root_state == 'key':
+            try:
+                self._root_key = json.loads(text[self._string_start:end + 1])
+            except ValueError:
+                self._root_key = None
+            self._root_state = 'colon'
+
+    def _element(self, text: str, end: int) -> list:
+        start, self._element_start = self._element_start, None
+        if start is None:
+            return []
+        try:
+            return [json.loads(text[start:end])]
+        except ValueError:
+            # A malformed element is dropped; the ones after it are still reported
+            return []
+
+    def feed(self, delta: str) -> list:
+        """Adds a chunk of text and returns the elements completed by it."""
+        self.text += delta
+        items = self._scan()
+        self.emitted += len(items)
+        return items
+
+    def close(self) -> list:
+        """Returns whatever elements remain once the stream has ended (the last one may be partial)."""
+        if self._target is None and not self.emitted:
+            # The array was never found by scanning; fall back to a lenient parse of the whole reply
+            try:
+                value, _ = parse_json_lenient(self.text, self._expected)
+            except ValueError:
+                return []
+            if isinstance(value, dict) and self.key is not None:
+                value = value.get(self.key)
+            if not isinstance(value, list):
+                return []
+            self.emitted = len(value)
+            return value
+        start, self._element_start = self._element_start, None
+        if self._done or start is None:
+            return []
+        repaired = _complete_prefix(self.text, start)
+        if repaired is None:
+            return []
+        try:
+            item = json.loads(repaired)
+        except ValueError:
+            return []
+        self.emitted += 1
+        return [item]